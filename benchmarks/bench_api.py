@@ -0,0 +1,311 @@
+"""
+Time API operations at scale, headless.
+
+    python -m benchmarks.bench_api [--scale small|medium|large] [--memory]
+                                   [--only WORKLOAD ...] [--json PATH]
+
+Each workload starts from a fresh API (see harness.Package.fresh). Times are
+for the main-thread work; writes happen on the stand-in async thread and are
+counted once everything has settled. Open/close cycles open projects through
+the in-process "command" backend, so they include the opener's poll interval.
+Discovery runs over a tree from benchmarks.tree; see bench_discovery for more.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from .harness import Package, Report, measure
+from .tree import generate
+
+SCALES = {
+    # constellations, projects per constellation, distinct projects, windows per cycle
+    "small": (50, 10, 500, 8),
+    "medium": (500, 25, 5000, 20),
+    "large": (2000, 50, 50000, 50),
+}
+# one-at-a-time mutations each rewrite every constellation, so time a sample of
+# them against the full set rather than all of them
+SAMPLE = 20
+SEARCH_QUERIES = ["a", "pr", "web", "api-se", "toolsx", "clent", "core/lib", "zzz"]
+
+
+def project_pool(count, root="/projects"):
+    """count distinct project paths, spread over a few directories"""
+    words = ["api", "web", "core", "tools", "client", "server", "docs", "infra"]
+    return [
+        os.path.join(
+            root,
+            words[i % len(words)],
+            "{}-{}-{}{}".format(
+                words[(i // 8) % len(words)],
+                words[(i // 64) % len(words)],
+                i,
+                ".sublime-project",
+            ),
+        )
+        for i in range(count)
+    ]
+
+
+def layout(scale, seed=0):
+    """{constellation name: [projects]}, drawn from a shared pool so they overlap"""
+    constellations, per, distinct, windows = SCALES[scale]
+    pool = project_pool(distinct)
+    rng = random.Random(seed)
+    return {
+        "constellation-{:05d}".format(i): rng.sample(pool, per)
+        for i in range(constellations)
+    }
+
+
+def populate(api, wanted):
+    with api.batch():
+        for name, projects in wanted.items():
+            api.add_constellation(name)
+            api.add_projects(name, projects)
+
+
+def bench_create(pkg, report, scale, memory):
+    wanted = layout(scale)
+    ops = sum(len(projects) + 1 for projects in wanted.values())
+
+    names = list(wanted)
+    api = pkg.fresh()
+    populate(api, {name: wanted[name] for name in names[:-SAMPLE]})
+    pkg.settle()
+    before = pkg.settings_writes
+
+    def one_by_one():
+        for name in names[-SAMPLE:]:
+            api.add_constellation(name)
+            for project in wanted[name]:
+                api.add_to(name, project)
+
+    seconds, peak, _ = measure(one_by_one, memory)
+    pkg.settle()
+    report.add(
+        "create last {} one by one".format(SAMPLE),
+        sum(len(wanted[name]) + 1 for name in names[-SAMPLE:]),
+        seconds,
+        peak,
+        writes=pkg.settings_writes - before,
+    )
+
+    api = pkg.fresh()
+    seconds, peak, _ = measure(lambda: populate(api, wanted), memory)
+    pkg.settle()
+    report.add("create in one batch", ops, seconds, peak, writes=pkg.settings_writes)
+
+
+def bench_bulk(pkg, report, scale, memory):
+    wanted = layout(scale)
+    api = pkg.fresh()
+    populate(api, wanted)
+    pkg.settle()
+
+    names = list(wanted)[:SAMPLE]
+    extra = project_pool(SCALES[scale][2], root="/more")
+    chunk = max(1, len(extra) // len(wanted))
+
+    def add():
+        for i, name in enumerate(names):
+            api.add_projects(name, extra[i * chunk : (i + 1) * chunk])
+
+    def remove():
+        for i, name in enumerate(names):
+            api.remove_projects(name, extra[i * chunk : (i + 1) * chunk])
+
+    for label, run in (("add_projects", add), ("remove_projects", remove)):
+        before = pkg.settings_writes
+        seconds, peak, _ = measure(run, memory)
+        pkg.settle()
+        report.add(
+            "bulk {}".format(label),
+            chunk * len(names),
+            seconds,
+            peak,
+            writes=pkg.settings_writes - before,
+        )
+
+
+def bench_rename(pkg, report, scale, memory):
+    wanted = layout(scale)
+    api = pkg.fresh()
+    populate(api, wanted)
+    pkg.settle()
+
+    names = list(wanted)[:SAMPLE]
+
+    def rename():
+        for name in names:
+            api.rename_constellation(name, name + "-renamed")
+
+    seconds, peak, _ = measure(rename, memory)
+    report.add("rename", len(names), seconds, peak)
+
+
+def bench_views(pkg, report, scale, memory):
+    wanted = layout(scale)
+    api = pkg.fresh()
+    populate(api, wanted)
+    projects = list(api.projects_in_constellations())
+    rounds = 200
+
+    def read():
+        for i in range(rounds):
+            api.open_constellations()
+            api.closed_constellations()
+            api.active_constellations()
+            api.open_projects
+            api.constellations_for(projects[i % len(projects)])
+
+    seconds, peak, _ = measure(read, memory)
+    report.add("cached views (5 reads)", rounds, seconds, peak)
+
+    def read_after_writes():
+        for i in range(rounds):
+            api.bump()
+            api.closed_constellations()
+
+    seconds, peak, _ = measure(read_after_writes, memory)
+    report.add("view rebuilt after each bump", rounds, seconds, peak)
+
+
+def bench_persist(pkg, report, scale, memory):
+    wanted = layout(scale)
+    for storage in ("settings", "journal"):
+        api = pkg.fresh(storage=storage)
+        populate(api, wanted)
+        pkg.settle()
+
+        seconds, peak, _ = measure(api.save_state, memory)
+        report.add("save_state ({})".format(storage), 1, seconds, peak)
+
+        API = pkg.api.API
+        seconds, peak, _ = measure(API.restore_state, memory)
+        report.add("restore_state ({})".format(storage), 1, seconds, peak)
+
+
+def bench_open_close(pkg, report, scale, memory, cycles=5):
+    windows = SCALES[scale][3]
+    projects = project_pool(windows, root="/open")
+    api = pkg.fresh()
+    populate(api, {"work": projects, "other": projects[: windows // 2]})
+    command = pkg.plugin.CloseConstellationCommand()
+    sublime = pkg.sublime
+
+    def opened():
+        return len(api._project_windows) == len(projects)
+
+    def showing():
+        # closing keeps the active window, emptied
+        return {window.project_file_name() for window in sublime.windows()} - {None}
+
+    def closed():
+        return not showing()
+
+    def cycle():
+        for _ in range(cycles):
+            api.open_constellation("work")
+            assert sublime.run_main(opened), "projects never opened"
+            command.run("work")
+            assert sublime.run_main(closed), "never closed"
+
+    seconds, peak, _ = measure(cycle, memory)
+    report.add(
+        "open+close {} windows".format(windows), cycles, seconds, peak, windows=windows
+    )
+
+    def switch():
+        for _ in range(cycles):
+            api.switch_constellation("work")
+            assert sublime.run_main(opened), "projects never opened"
+            api.switch_constellation("other")
+            assert sublime.run_main(
+                lambda: showing() == set(projects[: windows // 2])
+            ), "never switched"
+
+    seconds, peak, _ = measure(switch, memory)
+    report.add("switch there and back", cycles, seconds, peak)
+
+
+def bench_search(pkg, report, scale, memory):
+    wanted = layout(scale)
+    api = pkg.fresh()
+    populate(api, wanted)
+
+    seconds, peak, search = measure(api.project_search, memory)
+    report.add("build project search", len(search), seconds, peak)
+
+    latencies = []
+    for query in SEARCH_QUERIES * 5:
+        for end in range(1, len(query) + 1):
+            # as typed, one keystroke at a time
+            started = time.perf_counter()
+            search.search(query[:end])
+            latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    report.add(
+        "search per keystroke",
+        len(latencies),
+        sum(latencies),
+        p95_ms=round(latencies[int(0.95 * len(latencies)) - 1] * 1000, 3),
+    )
+
+
+def bench_discover(pkg, report, scale, memory):
+    with tempfile.TemporaryDirectory(prefix="constellation-tree-") as directory:
+        # about 20 entries (sources, vendored files, .git) per distinct project
+        root = os.path.join(directory, "tree")
+        generate(root, SCALES[scale][2] * 20)
+
+        api = pkg.fresh(search_path=root)
+        cold, peak, (found, pending) = measure(
+            lambda: api.discover(".sublime-project", budget=600), memory
+        )
+        report.add("discover (cold)", len(found), cold, peak, pending=pending)
+        warm, peak, (found, pending) = measure(
+            lambda: api.discover(".sublime-project", budget=600), memory
+        )
+        report.add("discover (indexed)", len(found), warm, peak)
+        pkg.settle()
+
+
+WORKLOADS = {
+    "create": bench_create,
+    "bulk": bench_bulk,
+    "rename": bench_rename,
+    "views": bench_views,
+    "persist": bench_persist,
+    "open_close": bench_open_close,
+    "search": bench_search,
+    "discover": bench_discover,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--memory", action="store_true", help="track peak memory")
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS))
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args(argv)
+
+    pkg = Package()
+    report = Report(
+        "Constellation API, {} scale ({} constellations x {} projects)".format(
+            args.scale, SCALES[args.scale][0], SCALES[args.scale][1]
+        )
+    )
+    report.header()
+    for name in args.only or WORKLOADS:
+        WORKLOADS[name](pkg, report, args.scale, args.memory)
+    if args.json:
+        report.write(args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Compare ways of finding project and workspace files in generated trees.
+
+    python -m benchmarks.bench_discovery [--sizes 1000 10000 100000 1000000]
+                                         [--trees DIR] [--json PATH]
+
+Backends, each run in its own process so peak RSS and syscall counts are
+comparable:
+
+- find: the original approach, one `find ROOT -maxdepth 5 -name ...` per
+  suffix, as the project and workspace lists used to shell out to
+- scanner: a cold Scanner walk, straight off the filesystem
+- index cold: ProjectIndex.refresh from nothing, including writing the index
+- index warm: loading that index back and refreshing it (stat only)
+- lists: what the project and workspace lists do now, API.discover for each
+  suffix from a fresh cache (so the first scans cold and the second doesn't)
+
+Trees come from benchmarks.tree and are kept under --trees between runs, since
+the big ones take a while to make.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from .tree import generate
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+SUFFIXES = (".sublime-project", ".sublime-workspace")
+BACKENDS = ["noop", "find", "scanner", "index cold", "index warm", "lists"]
+
+
+class Counted:
+    """Count calls to the os functions the scanner uses to touch the disk"""
+
+    names = ("scandir", "stat", "lstat", "listdir")
+
+    def __init__(self):
+        self.calls = dict.fromkeys(self.names, 0)
+        self.originals = {}
+
+    def wrap(self, name):
+        original = self.originals[name] = getattr(os, name)
+
+        def counted(*args, **kwargs):
+            self.calls[name] += 1
+            return original(*args, **kwargs)
+
+        return counted
+
+    def __enter__(self):
+        for name in self.names:
+            setattr(os, name, self.wrap(name))
+        return self
+
+    def __exit__(self, *exc):
+        for name, original in self.originals.items():
+            setattr(os, name, original)
+
+
+def child(backend, root, index_path):
+    """Run backend once in this process; print what it found as JSON"""
+    from .harness import Package
+
+    package = Package()
+    discovery = package.discovery
+    if backend == "lists":
+        api = package.fresh(search_path=root)
+    found = []
+    with Counted() as counted:
+        started = time.perf_counter()
+        if backend == "scanner":
+            for path, entry, changed in discovery.Scanner().walk(root):
+                found.extend(name for name in entry["files"] if name.endswith(SUFFIXES))
+        elif backend.startswith("index"):
+            index = discovery.ProjectIndex(index_path)
+            index.refresh(root, discovery.Scanner())
+            for suffix in SUFFIXES:
+                found.extend(index.files(root, suffix))
+        elif backend == "lists":
+            for suffix in SUFFIXES:
+                found.extend(api.discover(suffix, budget=3600)[0])
+        seconds = time.perf_counter() - started
+    if backend == "lists":
+        package.settle()
+    print(json.dumps({"seconds": seconds, "found": len(found), "fs": counted.calls}))
+
+
+def strace_prefix(out):
+    if not shutil.which("strace"):
+        return []
+    return ["strace", "-f", "-c", "-o", out]
+
+
+def syscalls(out):
+    """The total from strace -c's summary, if it ran"""
+    try:
+        with open(out) as infile:
+            for line in infile:
+                fields = line.split()
+                if fields and fields[-1] == "total":
+                    return int(fields[2])
+    except (FileNotFoundError, ValueError, IndexError):
+        pass
+    return None
+
+
+def run(command, strace):
+    """(wall seconds, stdout, peak RSS in KiB, syscalls or None)"""
+    out = tempfile.mktemp(suffix=".strace")
+    prefix = strace_prefix(out) if strace else []
+    started = time.perf_counter()
+    process = subprocess.Popen(prefix + command, stdout=subprocess.PIPE)
+    stdout = process.stdout.read()
+    # wait4 for this child's own rusage, rather than every child's maximum
+    pid, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - started
+    # reaped already; keep Popen from trying again
+    process.returncode = status
+    process.stdout.close()
+    if status:
+        raise RuntimeError("{} failed (status {})".format(command, status))
+    counted = syscalls(out)
+    if os.path.exists(out):
+        os.remove(out)
+    return seconds, stdout.decode(), usage.ru_maxrss, counted
+
+
+def bench(backend, root, index_path, strace):
+    """One row's worth of numbers for backend over the tree at root"""
+    if backend == "find":
+        seconds = rss = 0.0
+        calls, found = 0, 0
+        for suffix in SUFFIXES:
+            wall, stdout, peak, counted = run(
+                ["find", root, "-maxdepth", "5", "-name", "*" + suffix], strace
+            )
+            seconds += wall
+            rss = max(rss, peak)
+            calls = None if counted is None or calls is None else calls + counted
+            found += len(stdout.splitlines())
+        return {
+            "seconds": seconds,
+            "work": seconds,
+            "found": found,
+            "rss_kb": rss,
+            "syscalls": calls,
+            "fs_calls": None,
+        }
+
+    command = [
+        sys.executable,
+        "-m",
+        "benchmarks.bench_discovery",
+        "--child",
+        backend,
+        root,
+        index_path,
+    ]
+    wall, stdout, rss, calls = run(command, strace)
+    result = json.loads(stdout)
+    return {
+        "seconds": wall,
+        "work": result["seconds"],
+        "found": result["found"],
+        "rss_kb": rss,
+        "syscalls": calls,
+        "fs_calls": sum(result["fs"].values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES)
+    parser.add_argument(
+        "--trees",
+        default=os.path.join(tempfile.gettempdir(), "constellation-trees"),
+        help="where generated trees are kept",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--strace", action="store_true", help="count syscalls")
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        return child(*args.child)
+
+    rows = []
+    print(
+        "{:>9} {:<11} {:>9} {:>9} {:>11} {:>7} {:>9} {:>9} {:>9}".format(
+            "entries",
+            "backend",
+            "wall ms",
+            "work ms",
+            "entries/s",
+            "found",
+            "RSS KiB",
+            "fs calls",
+            "syscalls",
+        ),
+        flush=True,
+    )
+    for size in args.sizes:
+        root = os.path.join(args.trees, "{}-{}".format(size, args.seed))
+        tree = generate(root, size, args.seed)
+        index_path = os.path.join(
+            args.trees, "{}-{}.index.json".format(size, args.seed)
+        )
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        for backend in BACKENDS:
+            row = dict(
+                bench(backend, root, index_path, args.strace),
+                backend=backend,
+                entries=tree["total"],
+            )
+            row["rate"] = tree["total"] / row["work"] if row["work"] else None
+            rows.append(row)
+            print(
+                "{:>9} {:<11} {:>9.1f} {:>9.1f} {:>11} {:>7} {:>9} {:>9} {:>9}".format(
+                    row["entries"],
+                    backend,
+                    row["seconds"] * 1000,
+                    row["work"] * 1000,
+                    "-" if backend == "noop" else "{:.0f}".format(row["rate"]),
+                    row["found"],
+                    row["rss_kb"],
+                    "-" if row["fs_calls"] is None else row["fs_calls"],
+                    "-" if row["syscalls"] is None else row["syscalls"],
+                ),
+                flush=True,
+            )
+
+    if args.json:
+        with open(args.json, "w") as outfile:
+            json.dump({"rows": rows}, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Load Constellation outside Sublime, reset it between runs, and time things.
+
+The package is imported as "Constellation" (as Sublime would) with the stand-in
+`sublime` and `sublime_plugin` modules from stubs/ ahead of it on sys.path.
+Each run gets a fresh cache dir, fresh settings and a clean API.
+"""
+
+import atexit
+import gc
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+STUBS = os.path.join(HERE, "stubs")
+
+
+class Package:
+    """The loaded plugin, plus what's needed to put it back as it started"""
+
+    def __init__(self, root=ROOT):
+        if STUBS not in sys.path:
+            sys.path.insert(0, STUBS)
+        import sublime
+
+        self.sublime = sublime
+        self.plugin = self.load(root)
+        self.api = sys.modules["Constellation.util.api"]
+        self.discovery = sys.modules["Constellation.util.discovery"]
+        self.catalog = sys.modules["Constellation.util.catalog"]
+        self.opener = sys.modules["Constellation.util.opener"]
+        self.timings = sys.modules["Constellation.util.timings"]
+        atexit.register(self.cleanup)
+        self.defaults = {
+            key: value
+            for key, value in vars(self.api.API).items()
+            if not key.startswith("__")
+            and not callable(value)
+            and not isinstance(value, (classmethod, staticmethod, property))
+        }
+
+    @staticmethod
+    def load(root):
+        if "Constellation" in sys.modules:
+            return sys.modules["Constellation"]
+        spec = importlib.util.spec_from_file_location(
+            "Constellation",
+            os.path.join(root, "constellation.py"),
+            submodule_search_locations=[root],
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["Constellation"] = module
+        spec.loader.exec_module(module)
+        return module
+
+    def fresh(self, **settings):
+        """A clean API over a new cache dir, with settings applied; returns API()"""
+        API = self.api.API
+        if API.watcher:
+            API.watcher.stop()
+        self.sublime.run_async()
+        self.discovery.ProjectIndex.flush_all()
+        self.cleanup()
+        self.sublime.reset()
+        self.sublime._root = tempfile.mkdtemp(prefix="constellation-bench-")
+
+        for key, value in self.defaults.items():
+            # containers are shared with the class; give each run its own
+            setattr(API, key, value.copy() if hasattr(value, "copy") else value)
+        self.discovery.ProjectIndex._instances.clear()
+        self.catalog.Catalog._info.clear()
+        self.opener.Backends.timings.clear()
+        self.timings.Timings.samples = deque(maxlen=self.timings.Timings.size)
+
+        state = self.sublime.load_settings("Constellation.sublime-settings")
+        # nothing watches in the background, and projects open in-process
+        defaults = {
+            "watch_search_paths": False,
+            "open_backend": "command",
+        }
+        defaults.update(settings)
+        for key, value in defaults.items():
+            state.set(key, value)
+        with Quiet():
+            API.load_state()
+        return API()
+
+    def settle(self, timeout=30.0):
+        """Let queued main-thread and async work (write-behind included) finish"""
+        deadline = time.monotonic() + timeout
+        for _ in range(3):
+            with Quiet():
+                self.sublime.run_main(timeout=timeout)
+                self.sublime.run_async(timeout=timeout)
+            for index in list(self.discovery.ProjectIndex._instances.values()):
+                # background refreshes kicked off by discover()
+                while index.refreshing and time.monotonic() < deadline:
+                    time.sleep(0.01)
+
+    def cleanup(self):
+        """Remove the last run's cache dir"""
+        if self.sublime._root:
+            shutil.rmtree(self.sublime._root, ignore_errors=True)
+            self.sublime._root = None
+
+    @property
+    def settings_writes(self):
+        return self.sublime._saves["count"]
+
+
+class Quiet:
+    """Swallow the plugin's log lines while a run is being timed"""
+
+    def __enter__(self):
+        self.stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+
+    def __exit__(self, *exc):
+        sys.stdout.close()
+        sys.stdout = self.stdout
+
+
+def measure(run, memory=False):
+    """(seconds, peak bytes or None, run's result)"""
+    gc.collect()
+    if memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        with Quiet():
+            result = run()
+        seconds = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return seconds, peak, result
+
+
+class Report:
+    """Rows of results, printed as a table and optionally written as JSON"""
+
+    def __init__(self, title):
+        self.title = title
+        self.rows = []
+
+    def add(self, workload, ops, seconds, peak=None, **extra):
+        row = {
+            "workload": workload,
+            "ops": ops,
+            "seconds": seconds,
+            "per_op_ms": seconds * 1000 / ops if ops else None,
+            "peak_kb": peak / 1024 if peak is not None else None,
+        }
+        row.update(extra)
+        self.rows.append(row)
+        print(self.format(row), flush=True)
+        return row
+
+    @staticmethod
+    def format(row):
+        extra = ", ".join(
+            "{}={}".format(key, value)
+            for key, value in row.items()
+            if key not in ("workload", "ops", "seconds", "per_op_ms", "peak_kb")
+        )
+        return "{:<34} {:>8} {:>10.1f} {:>10} {:>10}  {}".format(
+            row["workload"],
+            row["ops"],
+            row["seconds"] * 1000,
+            "-" if row["per_op_ms"] is None else "{:.3f}".format(row["per_op_ms"]),
+            "-" if row["peak_kb"] is None else "{:.0f}".format(row["peak_kb"]),
+            extra,
+        )
+
+    def header(self):
+        print(self.title)
+        print(
+            "{:<34} {:>8} {:>10} {:>10} {:>10}".format(
+                "workload", "ops", "total ms", "ms/op", "peak KiB"
+            ),
+            flush=True,
+        )
+
+    def write(self, path):
+        with open(path, "w") as outfile:
+            json.dump({"title": self.title, "rows": self.rows}, outfile, indent=2)
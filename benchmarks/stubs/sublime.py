@@ -0,0 +1,350 @@
+"""
+Just enough of Sublime's `sublime` module to drive Constellation headless.
+
+Settings round-trip through deep copies (as the real ones do through JSON) and
+save_settings really writes the file, so persistence costs show up. Windows
+are plain objects; opening a project makes one, closing it drops it.
+
+set_timeout callbacks queue for the "main thread", which is whoever calls
+run_main(); set_timeout_async callbacks run on a worker thread, like the
+editor's async thread.
+"""
+
+import copy
+import heapq
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+
+VERSION = "4126"
+# made on first use; the harness points it somewhere fresh for each run
+_root = None
+_settings = {}
+_windows = []
+_ids = itertools.count(1)
+_saves = {"count": 0}
+
+
+def version():
+    return VERSION
+
+
+def platform():
+    return "linux"
+
+
+def arch():
+    return "x64"
+
+
+def _home():
+    global _root
+    if _root is None:
+        _root = tempfile.mkdtemp(prefix="constellation-bench-")
+    return _root
+
+
+def cache_path():
+    return os.path.join(_home(), "Cache")
+
+
+def packages_path():
+    return os.path.join(_home(), "Packages")
+
+
+def installed_packages_path():
+    return os.path.join(_home(), "Installed Packages")
+
+
+def executable_path():
+    # never actually run; the benchmarks open projects in-process
+    return "/bin/true"
+
+
+# settings
+
+
+class Settings:
+    def __init__(self, name):
+        self.name = name
+        self.values = {}
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        return copy.deepcopy(self.values.get(key, default))
+
+    def set(self, key, value):
+        self.values[key] = copy.deepcopy(value)
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def has(self, key):
+        return key in self.values
+
+    def erase(self, key):
+        self.values.pop(key, None)
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+    def to_dict(self):
+        return copy.deepcopy(self.values)
+
+
+def load_settings(name):
+    if name not in _settings:
+        _settings[name] = Settings(name)
+    return _settings[name]
+
+
+def save_settings(name):
+    _saves["count"] += 1
+    path = os.path.join(packages_path(), "User", name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as outfile:
+        json.dump(load_settings(name).values, outfile, indent=4)
+
+
+def reset():
+    """Forget all settings and windows (stub only)"""
+    _settings.clear()
+    del _windows[:]
+    _saves["count"] = 0
+
+
+# windows and views
+
+
+class View:
+    def __init__(self, window=None):
+        self._id = next(_ids)
+        self._window = window
+        self.name = ""
+        self.text = ""
+        self.scratch = False
+
+    def id(self):
+        return self._id
+
+    def window(self):
+        return self._window
+
+    def file_name(self):
+        return None
+
+    def set_name(self, name):
+        self.name = name
+
+    def set_scratch(self, scratch):
+        self.scratch = scratch
+
+    def run_command(self, cmd, args=None):
+        if cmd == "append":
+            self.text += (args or {}).get("characters", "")
+
+
+class Window:
+    def __init__(self, project=None):
+        self._id = next(_ids)
+        self._project = project
+        self._views = [View(self)]
+
+    def id(self):
+        return self._id
+
+    def is_valid(self):
+        return self in _windows
+
+    def project_file_name(self):
+        return self._project
+
+    def project_data(self):
+        return {} if self._project else None
+
+    def extract_variables(self):
+        variables = {}
+        if self._project:
+            variables["project"] = self._project
+            variables["project_name"] = os.path.basename(self._project)
+            variables["project_path"] = os.path.dirname(self._project)
+        return variables
+
+    def active_view(self):
+        return self._views[-1]
+
+    def views(self):
+        return list(self._views)
+
+    def new_file(self):
+        view = View(self)
+        self._views.append(view)
+        return view
+
+    def focus_view(self, view):
+        pass
+
+    def bring_to_front(self):
+        # the last window in the list is the active one
+        if self in _windows:
+            _windows.remove(self)
+            _windows.append(self)
+
+    def run_command(self, cmd, args=None):
+        args = args or {}
+        if cmd == "open_project_or_workspace":
+            if args.get("new_window"):
+                _windows.append(Window(args["file"]))
+            else:
+                self._project = args["file"]
+        elif cmd == "close_workspace":
+            self._project = None
+        elif cmd == "close_window" and self in _windows:
+            _windows.remove(self)
+
+
+def windows():
+    return list(_windows)
+
+
+def active_window():
+    if not _windows:
+        _windows.append(Window())
+    return _windows[-1]
+
+
+def open_window(project=None):
+    """Make a window showing project, as if the user had (stub only)"""
+    window = Window(project)
+    _windows.append(window)
+    return window
+
+
+def run_command(cmd, args=None):
+    if cmd == "new_window":
+        _windows.append(Window())
+
+
+def status_message(message):
+    pass
+
+
+def message_dialog(message):
+    pass
+
+
+def error_message(message):
+    pass
+
+
+def ok_cancel_dialog(message, ok_title=""):
+    return True
+
+
+class ListInputItem:
+    def __init__(self, text, value, details="", annotation="", kind=None):
+        self.text = text
+        self.value = value
+        self.details = details
+        self.annotation = annotation
+        self.kind = kind
+
+
+class Html:
+    def __init__(self, text):
+        self.text = text
+
+
+# timers
+
+
+class _Queue:
+    def __init__(self):
+        self.heap = []
+        self.order = itertools.count()
+        self.ready = threading.Condition()
+
+    def push(self, callback, delay):
+        with self.ready:
+            due = time.monotonic() + delay / 1000
+            heapq.heappush(self.heap, (due, next(self.order), callback))
+            self.ready.notify()
+
+    def pop_due(self):
+        with self.ready:
+            if self.heap and self.heap[0][0] <= time.monotonic():
+                return heapq.heappop(self.heap)[2]
+        return None
+
+    def wait(self, timeout):
+        with self.ready:
+            if self.heap:
+                timeout = min(timeout, max(0, self.heap[0][0] - time.monotonic()))
+            self.ready.wait(timeout)
+
+    def __len__(self):
+        return len(self.heap)
+
+
+_main = _Queue()
+_async = _Queue()
+
+
+def set_timeout(callback, delay=0):
+    _main.push(callback, delay)
+
+
+def set_timeout_async(callback, delay=0):
+    _async.push(callback, delay)
+
+
+def _async_worker():
+    while True:
+        callback = _async.pop_due()
+        if callback is None:
+            _async.wait(0.05)
+            continue
+        try:
+            callback()
+        except Exception as e:
+            print("async callback failed:", repr(e))
+
+
+threading.Thread(target=_async_worker, daemon=True).start()
+
+
+def run_main(until=None, timeout=10.0):
+    """
+    Be the main thread (stub only): run due set_timeout callbacks until
+    until() is true or, without one, until nothing is queued. Returns whether
+    it finished before timeout.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        callback = _main.pop_due()
+        if callback is not None:
+            callback()
+            continue
+        if until is None and not len(_main):
+            return True
+        if until is not None and until():
+            return True
+        _main.wait(0.005)
+    return False
+
+
+def run_async(timeout=10.0):
+    """
+    Wait for everything queued on the async thread, delayed callbacks
+    included, to have run (stub only)
+    """
+    with _async.ready:
+        last = max((due for due, order, callback in _async.heap), default=0)
+    done = threading.Event()
+    set_timeout_async(done.set, max(0, last - time.monotonic()) * 1000)
+    return done.wait(timeout)
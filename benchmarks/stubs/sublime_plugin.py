@@ -0,0 +1,66 @@
+"""Just enough of Sublime's `sublime_plugin` module to import Constellation."""
+
+
+class Command:
+    def name(self):
+        return type(self).__name__
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class WindowCommand(Command):
+    def __init__(self, window=None):
+        self.window = window
+
+
+class TextCommand(Command):
+    def __init__(self, view=None):
+        self.view = view
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view=None):
+        self.view = view
+
+
+class CommandInputHandler:
+    def name(self):
+        return "text"
+
+    def placeholder(self):
+        return ""
+
+    def initial_text(self):
+        return ""
+
+    def preview(self, text):
+        return ""
+
+    def validate(self, text):
+        return True
+
+    def next_input(self, args):
+        return None
+
+
+class TextInputHandler(CommandInputHandler):
+    pass
+
+
+class ListInputHandler(CommandInputHandler):
+    def list_items(self):
+        return []
+
+
+def on_activated(view_id):
+    pass
+
+
+def on_activated_async(view_id):
+    pass
@@ -0,0 +1,173 @@
+"""
+Generate reproducible directory trees that look like a code checkout root.
+
+    python -m benchmarks.tree PATH --entries 100000 [--seed 0]
+
+Projects are grouped a couple of levels down, some nested deeper than the
+scanner looks. Each has a .sublime-project and usually a .sublime-workspace
+(some have only one or the other) beside a deeply nested src/, and most carry
+vendored dependencies (node_modules, vendor, .venv) and a .git directory full
+of small files. A few symlinks point back up the tree, making loops for anything
+that follows them. The same size and seed always give the same tree.
+"""
+
+import argparse
+import json
+import os
+import random
+
+PROJECT = '{\n\t"folders": [{"path": "."}]\n}\n'
+WORKSPACE = '{\n\t"project": "{}.sublime-project"\n}\n'
+VENDORED = ["node_modules", "vendor", ".venv", "bower_components"]
+WORDS = ["api", "web", "core", "tools", "client", "server", "docs", "infra", "ui"]
+MANIFEST = "tree.json"
+
+
+class Tree:
+    """Creates entries under root until it has made about `entries` of them"""
+
+    def __init__(self, root, entries, seed=0):
+        self.root = root
+        self.budget = entries
+        self.rng = random.Random(seed)
+        self.counts = {
+            "dirs": 0,
+            "files": 0,
+            "links": 0,
+            "projects": 0,
+            "workspaces": 0,
+            "deepest": 0,
+        }
+
+    @property
+    def made(self):
+        return self.counts["dirs"] + self.counts["files"] + self.counts["links"]
+
+    def left(self):
+        return self.budget - self.made
+
+    def mkdir(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.counts["dirs"] += 1
+        depth = os.path.relpath(path, self.root).count(os.sep) + 1
+        self.counts["deepest"] = max(self.counts["deepest"], depth)
+
+    def touch(self, path, text=""):
+        with open(path, "w") as outfile:
+            outfile.write(text)
+        self.counts["files"] += 1
+
+    def link(self, target, path):
+        try:
+            os.symlink(target, path, target_is_directory=True)
+        except OSError:
+            # unprivileged Windows, say; the loops are a bonus
+            return
+        self.counts["links"] += 1
+
+    def files(self, directory, count, suffix=".txt"):
+        for i in range(count):
+            if self.left() <= 0:
+                return
+            self.touch(os.path.join(directory, "file{}{}".format(i, suffix)))
+
+    def nested(self, directory, depth, fan_out, files):
+        """depth levels of subdirectories, fan_out wide, with files in each"""
+        if depth == 0 or self.left() <= 0:
+            return
+        for i in range(fan_out):
+            child = os.path.join(directory, "{}{}".format(self.rng.choice(WORDS), i))
+            self.mkdir(child)
+            self.files(child, files)
+            self.nested(child, depth - 1, max(1, fan_out - 1), files)
+
+    def project(self, directory, name):
+        self.mkdir(directory)
+        kind = self.rng.random()
+        if kind < 0.9:
+            self.touch(os.path.join(directory, name + ".sublime-project"), PROJECT)
+            self.counts["projects"] += 1
+        if kind > 0.1:
+            self.touch(
+                os.path.join(directory, name + ".sublime-workspace"),
+                WORKSPACE.replace("{}", name),
+            )
+            self.counts["workspaces"] += 1
+
+        src = os.path.join(directory, "src")
+        self.mkdir(src)
+        self.nested(src, self.rng.randint(3, 12), 2, self.rng.randint(1, 4))
+
+        if self.rng.random() < 0.7:
+            vendored = os.path.join(directory, self.rng.choice(VENDORED))
+            self.mkdir(vendored)
+            for i in range(self.rng.randint(2, 8)):
+                package = os.path.join(vendored, "package{}".format(i))
+                self.mkdir(package)
+                self.nested(package, self.rng.randint(2, 5), 2, 3)
+
+        git = os.path.join(directory, ".git", "objects")
+        self.mkdir(os.path.dirname(git))
+        self.mkdir(git)
+        for i in range(self.rng.randint(1, 6)):
+            bucket = os.path.join(git, "{:02x}".format(i))
+            self.mkdir(bucket)
+            self.files(bucket, self.rng.randint(2, 10), suffix="")
+
+        if self.rng.random() < 0.2:
+            # back up to the group; following it never ends
+            self.link("..", os.path.join(directory, "loop"))
+
+    def build(self):
+        os.makedirs(self.root, exist_ok=True)
+        # a loop right at the top, to the root itself
+        self.link(".", os.path.join(self.root, "self"))
+        i = 0
+        while self.left() > 0:
+            group = os.path.join(self.root, "group{}".format(i % 32))
+            if not os.path.isdir(group):
+                self.mkdir(group)
+            # most projects sit two levels down; some much deeper
+            parts = [group] + [
+                "nest{}".format(level) for level in range(self.rng.choice([0, 0, 1, 4]))
+            ]
+            name = "{}-{}".format(self.rng.choice(WORDS), i)
+            self.project(os.path.join(*(parts + [name])), name)
+            i += 1
+        return self.counts
+
+
+def generate(root, entries, seed=0):
+    """
+    A tree of about `entries` entries at root, reused if root already holds
+    one made with the same arguments; returns its manifest.
+    """
+    manifest = os.path.join(root, MANIFEST)
+    try:
+        with open(manifest) as infile:
+            made = json.load(infile)
+        if made["entries"] == entries and made["seed"] == seed:
+            return made
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    if os.path.exists(root) and os.listdir(root):
+        raise ValueError("{} exists and isn't a tree we made".format(root))
+
+    made = dict(Tree(root, entries, seed).build(), entries=entries, seed=seed)
+    made["total"] = made["dirs"] + made["files"] + made["links"]
+    with open(manifest, "w") as outfile:
+        json.dump(made, outfile, indent=2)
+    return made
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("root")
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    print(json.dumps(generate(args.root, args.entries, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,26 +8,78 @@ import sublime
 import sublime_plugin
 
 import os
-import subprocess
-import json
+import threading
+import time
 
 from .util import input_handlers as collect
 from .util.api import API
+from .util.discovery import ProjectIndex
 from .util import constants as c
+from .util import workspace
+from .util.timings import Timings
 
 
 def plugin_loaded():
-    API.load_state()
+    started = time.perf_counter()
+    # the rest of our state (and the watcher) comes up on the async thread
+    API.load_state(defer=True)
+    sublime.set_timeout_async(API().watch, 0)
+    sublime.set_timeout_async(warm_search, 0)
+    print(
+        c.LOG_TEMPLATE,
+        "Loaded in {:.1f}ms".format((time.perf_counter() - started) * 1000),
+    )
+
+
+def warm_search():
+    # build the search index before anyone's waiting on it; queued behind
+    # restore_state, since it needs constellations and recent use
+    sublime.set_timeout(start_search, 0)
+
+
+def start_search():
+    # copy the projects here on the main thread, where they change
+    known = list(API().projects_in_constellations())
+    threading.Thread(target=API().project_search, args=(known,), daemon=True).start()
 
 
 def plugin_unloaded():
+    # flush anything still waiting on the write-behind timer
     API.save_state()
+    API().unwatch()
+    ProjectIndex.flush_all()
 
 
 class _BaseApplicationCommand(sublime_plugin.ApplicationCommand, API):
     pass
 
 
+class ConstellationListener(sublime_plugin.EventListener, API):
+    """Keep open state in step with projects opened/closed outside Constellation (ST4)"""
+
+    def on_new_window(self, window):
+        self.project_loaded(window)
+
+    def on_load_project(self, window):
+        self.project_loaded(window)
+
+    def on_pre_close_project(self, window):
+        self.project_closing(window)
+
+    def on_pre_close_window(self, window):
+        self.project_closing(window)
+
+    # anything the user does puts off opening lazy projects
+    def on_activated_async(self, view):
+        self.active()
+
+    def on_modified_async(self, view):
+        self.active()
+
+    def on_selection_modified_async(self, view):
+        self.active()
+
+
 # TODO: I won't pretend to completely grok when and why ST3's api uses the various arg-passing conventions it's using. May be worth a refactor when this is better understood.
 
 
@@ -41,15 +93,6 @@ class OpenConstellationsInfoCommand(_BaseApplicationCommand):
         )
 
 
-# TODO: can remove below when a pure python or Windows-safe fallback for 'find' is implemented
-class WindowsUserQuestionCommand(_BaseApplicationCommand):
-    def is_enabled(self, *args):
-        return False
-
-    def description(self, *args):
-        return "Help wanted (see github) on these:"
-
-
 class OpenConstellationsCommand(_BaseApplicationCommand):
     def is_visible(self, index=None, **args):
         return index < len(self._open_constellations)
@@ -63,9 +106,7 @@ class OpenConstellationsCommand(_BaseApplicationCommand):
             relevant = self.open_constellations()
             const = relevant[index]
         return (
-            "    {} [{}]".format(
-                const, "∗" * len(self.constellations[const]["projects"])
-            )
+            "    {} [{}]".format(const, "∗" * len(self.projects_for(const)))
             if index < len(relevant)
             else "Oops. You shouldn't be seeing this. Better find someone who works here."
         )
@@ -183,13 +224,45 @@ class CloseConstellationCommand(_OpenConstellationCommand):
         if constellation not in self._open_constellations:
             return
 
-        for project in self.projects_for(constellation):
-            for window in sublime.windows():
-                if window.project_file_name() == project:
-                    window.run_command("close_workspace")
-                    if window.id() != sublime.active_window().id():
-                        window.run_command("close_window")
+        # leave projects that another open constellation still uses
+        windows = self.windows_for(self.closable_projects(constellation))
+        # mark it closed first, so the windows' close events have nothing to do
         self.close_constellation(constellation)
+        self.closer_for(windows).start()
+
+
+class SwitchConstellationCommand(_ActiveConstellationCommand):
+    """Close every other open constellation and open this one, diffing windows"""
+
+    def run(self, constellation):
+        self.switch_constellation(constellation)
+
+
+class OpenLazyProjectsCommand(_ExistingConstellationCommand):
+    """Open the lazy projects an open constellation is holding back, now"""
+
+    _list_class = collect.SelectLazyConstellationList
+
+    def run(self, constellation):
+        self.open_lazy(constellation)
+
+
+class ExportConstellationsCommand(_BaseApplicationCommand):
+    """Write constellations to the settings file (for backups, or leaving the journal)"""
+
+    def run(self):
+        self.export_state()
+        sublime.status_message("Constellations exported to " + c.PLUGIN_SETTINGS_FILE)
+
+
+class ShowTimingsCommand(_BaseApplicationCommand):
+    """Summarize recorded open/close/save/search timings in a scratch view"""
+
+    def run(self):
+        view = sublime.active_window().new_file()
+        view.set_name("Constellation timings")
+        view.set_scratch(True)
+        view.run_command("append", {"characters": Timings.report()})
 
 
 class ManageProjectsInfoCommand(_BaseApplicationCommand):
@@ -217,15 +290,7 @@ class UpgradeWorkspaceCommand(AddProjectCommand):
     already_open = False
 
     def is_enabled(self, *args):
-        # TODO: remove below when there's a fallback
-        if sublime.platform() == "windows":
-            return False
-        search_root = self.search_path
-        return (
-            True
-            if search_root and len(search_root) and os.path.exists(search_root)
-            else False
-        )
+        return True if len(self.search_roots) else False
 
     def input(self, args):
         return collect.FoundWorkspaceList()
@@ -235,68 +300,132 @@ class UpgradeWorkspaceCommand(AddProjectCommand):
             # print(c.LOG_TEMPLATE, "Nothing found to upgrade")
             return
 
-        workspace = None
+        add = super().run
 
-        # load the workspace
-        with open(workspace_path, "r") as infile:
-            workspace = json.load(infile)
+        def upgrade():
+            workspace_project = workspace.upgrade(workspace_path)
+            # constellations belong to the main thread
+            sublime.set_timeout(lambda: add(constellation, workspace_project), 0)
 
-        project = os.path.join(os.path.dirname(workspace_path), workspace["project"])
-        workspace_project = workspace_path.replace(
-            ".sublime-workspace", ".sublime-project"
-        )
+        # workspaces can be huge; keep the rewrite off the main thread
+        sublime.set_timeout_async(upgrade, 0)
+
+
+class UpgradeWorkspacesCommand(_ActiveConstellationCommand):
+    """Upgrade every workspace under the search paths into one constellation."""
+
+    # the whole tree matters here, so give a first scan more time
+    scan_budget = 60.0
 
-        if len(workspace["project"]) and os.path.exists(project):
-            # this seems to be set to a real value, so we'll make a link to the sublime-project
-            subprocess.Popen(
-                "ln -f '{:}' '{:}'".format(project, workspace_project), shell=True
+    def is_enabled(self, *args):
+        return True if len(self.search_roots) else False
+
+    def run(self, constellation):
+        # a scan and a pool of upgrades can take a minute; keep that off the
+        # async thread that every other plugin shares
+        threading.Thread(
+            target=self.upgrade_all, args=(constellation,), daemon=True
+        ).start()
+
+    def upgrade_all(self, constellation):
+        started = time.perf_counter()
+        found, pending = self.upgradable_workspaces(self.scan_budget)
+        if pending:
+            print(c.LOG_TEMPLATE, "Search paths still scanning; upgrading what's found")
+
+        def progress(done, total):
+            sublime.status_message(
+                "Constellation: upgraded {}/{} workspaces".format(done, total)
             )
-        elif not os.path.exists(workspace_project):
-            # some projects might have a null value, or maybe the file got deleted, so we'll just make an empty project
-            with open(workspace_project, "w") as outfile:
-                json.dump({}, outfile, indent=1)
-        else:
-            pass
-            # print(
-            #     c.LOG_TEMPLATE,
-            #     "I really hope we never get here",
-            #     workspace,
-            #     workspace_project,
-            #     workspace_path,
-            #     project,
-            # )
 
-        workspace["project"] = workspace_project
+        upgraded, failed = workspace.upgrade_all(
+            sorted(path for label, path in found),
+            workers=self.state.get("upgrade_workers", 8),
+            progress=progress,
+        )
+        for workspace_path, error in failed:
+            print(c.LOG_TEMPLATE, "Couldn't upgrade", workspace_path + ":", error)
 
-        with open(workspace_path, "w") as outfile:
-            json.dump(workspace, outfile, indent=1)
+        summary = "Upgraded {} of {} workspaces in {:.1f}s".format(
+            len(upgraded), len(found), time.perf_counter() - started
+        )
+        if failed:
+            summary += " ({} failed; see console)".format(len(failed))
+        print(c.LOG_TEMPLATE, summary)
 
-        super().run(constellation, workspace_project)
+        def finish():
+            self.add_projects(constellation, upgraded)
+            sublime.status_message("Constellation: " + summary)
 
-        # at this point, we need to have taken the workspace file, added a link adjacent to the project file, and replaced the project key in the workspace file with the pointer to the adjacent file
+        # constellations belong to the main thread
+        sublime.set_timeout(finish, 0)
 
 
 class FindProjectCommand(AddProjectCommand):
     already_open = False
 
     def is_enabled(self, *args):
-        # TODO: remove below when there's a fallback
-        if sublime.platform() == "windows":
-            return False
-        search_root = self.search_path
-        return (
-            True
-            if search_root and len(search_root) and os.path.exists(search_root)
-            else False
-        )
+        return True if len(self.search_roots) else False
 
     def input(self, args):
         return collect.FoundProjectList()
 
 
+class SearchProjectCommand(AddProjectCommand):
+    """Add a project found by fuzzy search over every project we know of"""
+
+    already_open = False
+
+    def input(self, args):
+        return collect.QueryProjectList()
+
+    def run(self, constellation, query, project):
+        super().run(constellation, project)
+
+
 class RemoveProjectCommand(_ActiveConstellationCommand):
     def input(self, args):
         return collect.ConstellationProjectList()
 
     def run(self, constellation, project):
         self.remove_from(constellation, project)
+
+
+class SetProjectPriorityCommand(_ActiveConstellationCommand):
+    def input(self, args):
+        return collect.PriorityProjectList()
+
+    def run(self, constellation, project, priority):
+        self.set_priority(constellation, project, int(priority))
+
+
+class ToggleLazyProjectCommand(_ActiveConstellationCommand):
+    def input(self, args):
+        return collect.ConstellationProjectList()
+
+    def run(self, constellation, project):
+        lazy = project in self.snapshot()[constellation].get("lazy", ())
+        self.set_lazy(constellation, project, not lazy)
+
+
+class AddProjectsCommand(_ActiveConstellationCommand):
+    """Add many projects at once; defaults to every open project."""
+
+    def run(self, constellation, projects=None, already_open=None):
+        if projects is None:
+            projects, already_open = self.open_projects, True
+        self.add_projects(constellation, projects, already_open=bool(already_open))
+
+
+class RemoveProjectsCommand(_ActiveConstellationCommand):
+    """Remove many projects at once; defaults to all of them, once confirmed."""
+
+    def run(self, constellation, projects=None):
+        if projects is None:
+            projects = self.projects_for(constellation)
+            if projects and not sublime.ok_cancel_dialog(
+                "Remove all {} projects from {}?".format(len(projects), constellation),
+                "Remove all",
+            ):
+                return
+        self.remove_projects(constellation, projects)
@@ -24,11 +24,22 @@ without a timeout error.
 
 import sublime
 import sublime_plugin
+import json
 import os
+import shutil
+import subprocess
+import tempfile
 
 from unittesting import DeferrableTestCase
 import Constellation
-from Constellation.util import input_handlers
+from Constellation.util import (
+    discovery,
+    input_handlers,
+    journal,
+    search,
+    timings,
+    workspace,
+)
 
 
 class TestCore(DeferrableTestCase):
@@ -209,9 +220,419 @@ class TestCore(DeferrableTestCase):
 
         # TODO: confirm it no longer appears in the remove menu?
 
+    def test_add_and_remove_projects(self):
+        constellation = "test_add_and_remove_projects"
+        onepath = self.make_project_path("one.sublime-project")
+        twopath = self.make_project_path("two.sublime-project")
+        yield self.create_constellation(constellation)
+
+        # duplicates collapse when the batch commits
+        sublime.run_command(
+            "add_projects",
+            {
+                "constellation": constellation,
+                "projects": [onepath, twopath, onepath],
+                "already_open": True,
+            },
+        )
+        self.assertEqual(
+            self.state.get("constellations")[constellation]["projects"],
+            [onepath, twopath],
+        )
+
+        sublime.run_command(
+            "remove_projects", {"constellation": constellation, "projects": [onepath]}
+        )
+        self.assertEqual(
+            self.state.get("constellations")[constellation]["projects"], [twopath]
+        )
+
+    def test_open_order(self):
+        constellation = "test_open_order"
+        onepath = self.make_project_path("one.sublime-project")
+        twopath = self.make_project_path("two.sublime-project")
+        yield self.create_constellation(constellation)
+
+        api = self.api()
+        api.add_projects(constellation, [onepath, twopath], already_open=True)
+        self.assertEqual(api.open_order(constellation), ([onepath, twopath], []))
+
+        api.set_priority(constellation, twopath, 10)
+        self.assertEqual(api.open_order(constellation), ([twopath, onepath], []))
+
+        api.set_lazy(constellation, twopath)
+        self.assertEqual(api.open_order(constellation), ([onepath], [twopath]))
+
+        # flags go with the project
+        api.remove_from(constellation, twopath)
+        self.assertEqual(
+            set(self.state.get("constellations")[constellation]),
+            {"archived", "projects"},
+        )
+        self.assertEqual(api.open_order(constellation), ([onepath], []))
+
+    @staticmethod
+    def showing():
+        return {window.project_file_name() for window in sublime.windows()}
+
+    def record_launches(self):
+        """Projects the openers actually launch, rather than find already open"""
+        launched = []
+        opener_for = self.api.opener_for
+
+        def recording(api, projects):
+            opener = opener_for(api, projects)
+            launch = opener.launch
+
+            def record(batch):
+                launched.extend(batch)
+                launch(batch)
+
+            opener.launch = record
+            return opener
+
+        self.api.opener_for = recording
+        self.addCleanup(setattr, self.api, "opener_for", opener_for)
+        return launched
+
+    def test_switch_constellation(self):
+        first, second = "test_switch_first", "test_switch_second"
+        onepath = self.make_project_path("one.sublime-project")
+        twopath = self.make_project_path("two.sublime-project")
+        threepath = self.make_project_path("three.sublime-project")
+        yield self.create_constellation(first)
+        yield self.create_constellation(second)
+
+        # both are open from creation, so their projects open as they're added
+        api = self.api()
+        api.add_projects(first, [onepath, twopath])
+        api.add_projects(second, [twopath, threepath])
+        # (and the windows have been tracked)
+        yield lambda: all(api.windows_for([p]) for p in (onepath, twopath, threepath))
+
+        shared = {window.id() for window in api.windows_for([twopath])}
+        launched = self.record_launches()
+        sublime.run_command("switch_constellation", {"constellation": first})
+        yield lambda: threepath not in self.showing()
+
+        self.assertEqual(self.open_constellations(), [first])
+        # the shared project kept its window, and nothing needed launching
+        self.assertTrue(shared and shared <= {w.id() for w in sublime.windows()})
+        self.assertIn(onepath, self.showing())
+        self.assertEqual(launched, [])
+
+        sublime.run_command("switch_constellation", {"constellation": second})
+        yield lambda: api.windows_for([threepath]) and onepath not in self.showing()
+
+        self.assertEqual(self.open_constellations(), [second])
+        self.assertTrue(shared <= {w.id() for w in sublime.windows()})
+        self.assertEqual(launched, [threepath])
+        yield self.close_constellation(second)
+
+    def test_hand_edit_reindexes(self):
+        constellation = "test_hand_edit_reindexes"
+        onepath = self.make_project_path("one.sublime-project")
+        yield self.create_constellation(constellation)
+
+        # as if added to the settings file by hand
+        defined = self.state.get("constellations")
+        defined[constellation]["projects"].append(onepath)
+        self.state.set("constellations", defined)
+
+        api = self.api()
+        yield lambda: api.in_constellation(constellation, onepath)
+        api.add_to(constellation, onepath, already_open=True)
+        self.assertEqual(
+            self.state.get("constellations")[constellation]["projects"], [onepath]
+        )
+
+    def test_batch_rolls_back_on_error(self):
+        constellation = "test_batch_rolls_back_on_error"
+        yield self.create_constellation(constellation)
+
+        api = self.api()
+        with self.assertRaises(KeyError):
+            with api.batch():
+                api.add_to(constellation, self.make_project_path("one.sublime-project"))
+                api.add_to("no such constellation", "nope")
+
+        self.assertEqual(
+            self.state.get("constellations")[constellation]["projects"], []
+        )
+
+        # renaming touches open state directly; that rolls back too
+        with self.assertRaises(KeyError):
+            with api.batch():
+                api.rename_constellation(constellation, constellation + "-renamed")
+                api.add_to("no such constellation", "nope")
+
+        self.assertIn(constellation, self.open_constellations())
+        self.assertNotIn(constellation + "-renamed", self.open_constellations())
+
+    def test_journal_replay(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = journal.Journal(directory)
+            log.compact({"a": {"projects": []}})
+            log.record({"a": {"projects": []}}, {"b": {"projects": ["p"]}})
+
+            reloaded = journal.Journal(directory)
+            self.assertEqual(reloaded.load(), {"b": {"projects": ["p"]}})
+            self.assertEqual(reloaded.entries, 2)
+
+    def test_journal_torn_tail(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = journal.Journal(directory)
+            log.compact({})
+            log.record({}, {"a": {"projects": []}})
+            with open(log.journal_path, "a") as outfile:
+                outfile.write('{"set": "b", "val')
+
+            reloaded = journal.Journal(directory)
+            self.assertEqual(reloaded.load(), {"a": {"projects": []}})
+            # the fragment is gone, so later entries replay too
+            reloaded.record({"a": {"projects": []}}, {"a": {"projects": []}, "c": {}})
+            self.assertEqual(
+                journal.Journal(directory).load(), {"a": {"projects": []}, "c": {}}
+            )
+
+    def test_journal_compaction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = journal.Journal(directory, compact_after=3)
+            log.compact({})
+            before = {}
+            for name in "abc":
+                after = dict(before, **{name: {"projects": []}})
+                log.record(before, after)
+                before = after
+
+            # the third entry folded everything into the snapshot
+            self.assertEqual(log.entries, 0)
+            self.assertEqual(os.path.getsize(log.journal_path), 0)
+            self.assertEqual(journal.Journal(directory).load(), before)
+
+    @staticmethod
+    def make_files(root, paths):
+        for path in paths:
+            path = os.path.join(root, *path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(path, "w").close()
+
+    @staticmethod
+    def scanned(scanner, root):
+        return sorted(
+            os.path.relpath(os.path.join(path, name), root).replace(os.sep, "/")
+            for path, entry, changed in scanner.walk(root)
+            for name in entry["files"]
+        )
+
+    def test_scanner_ignore(self):
+        with tempfile.TemporaryDirectory() as root:
+            self.make_files(
+                root,
+                [
+                    "a/a.sublime-project",
+                    "a/node_modules/dep/dep.sublime-project",
+                    "build/b.sublime-workspace",
+                    "scratch-1/c.sublime-project",
+                    "a/notes.txt",
+                ],
+            )
+            self.assertEqual(
+                self.scanned(discovery.Scanner(), root),
+                ["a/a.sublime-project", "scratch-1/c.sublime-project"],
+            )
+            self.assertEqual(
+                self.scanned(discovery.Scanner(ignore=["scratch-*"]), root),
+                [
+                    "a/a.sublime-project",
+                    "a/node_modules/dep/dep.sublime-project",
+                    "build/b.sublime-workspace",
+                ],
+            )
+
+    def test_scanner_depth(self):
+        with tempfile.TemporaryDirectory() as root:
+            # one project at each depth from 1 to 7
+            self.make_files(
+                root,
+                [
+                    "/".join(["d"] * level + ["p{}.sublime-project".format(level + 1)])
+                    for level in range(7)
+                ],
+            )
+            found = self.scanned(discovery.Scanner(depth=3), root)
+            self.assertEqual(
+                found,
+                [
+                    "d/d/p3.sublime-project",
+                    "d/p2.sublime-project",
+                    "p1.sublime-project",
+                ],
+            )
+
+            if shutil.which("find") and sublime.platform() != "windows":
+                # the same as find -maxdepth, which the lists used to shell out to
+                output = subprocess.check_output(
+                    ["find", root, "-maxdepth", "5", "-name", "*.sublime-project"]
+                )
+                self.assertEqual(
+                    self.scanned(discovery.Scanner(depth=5), root),
+                    sorted(
+                        os.path.relpath(path, root)
+                        for path in output.decode().splitlines()
+                    ),
+                )
+
+    def test_project_index_roots(self):
+        with tempfile.TemporaryDirectory() as directory:
+            first = os.path.join(directory, "first")
+            second = os.path.join(directory, "second")
+            self.make_files(first, ["a/a.sublime-project", "b/b.sublime-workspace"])
+            self.make_files(second, ["c/c.sublime-project"])
+
+            index = discovery.ProjectIndex(os.path.join(directory, "index.json"))
+            index.refresh(first)
+            index.refresh(second)
+            self.assertTrue(index.scanned(first) and index.scanned(second))
+            self.assertEqual(
+                index.files(first, ".sublime-project"),
+                [os.path.join(first, "a", "a.sublime-project")],
+            )
+            self.assertEqual(
+                index.files(second, ".sublime-project"),
+                [os.path.join(second, "c", "c.sublime-project")],
+            )
+
+            # refreshing one root leaves the other's entries alone
+            shutil.rmtree(os.path.join(first, "a"))
+            index.refresh(first)
+            self.assertEqual(index.files(first, ".sublime-project"), [])
+            self.assertEqual(len(index.files(second, ".sublime-project")), 1)
+
+            # and both come back from disk
+            index.flush()
+            reloaded = discovery.ProjectIndex(index.path)
+            self.assertEqual(reloaded.roots, {first, second})
+            self.assertEqual(
+                reloaded.files(first, ".sublime-workspace"),
+                [os.path.join(first, "b", "b.sublime-workspace")],
+            )
+
+    def test_project_index_incremental(self):
+        class Counting(discovery.Scanner):
+            def __init__(self):
+                super().__init__()
+                self.listed = []
+
+            def list_dir(self, path):
+                self.listed.append(path)
+                return super().list_dir(path)
+
+        with tempfile.TemporaryDirectory() as directory:
+            root = os.path.join(directory, "root")
+            self.make_files(root, ["a/a.sublime-project", "b/b.sublime-project"])
+            index = discovery.ProjectIndex(os.path.join(directory, "index.json"))
+            changes = []
+            index.listeners.append(lambda added, removed: changes.append(added))
+            index.refresh(root, Counting())
+
+            # nothing moved: every directory is stat'd, none re-listed
+            scanner = Counting()
+            index.refresh(root, scanner)
+            self.assertEqual(scanner.listed, [])
+
+            changed = os.path.join(root, "b")
+            self.make_files(root, ["b/new.sublime-project"])
+            # don't rely on the filesystem's mtime resolution
+            mtime = os.stat(changed).st_mtime_ns + 10**9
+            os.utime(changed, ns=(mtime, mtime))
+            scanner = Counting()
+            index.refresh(root, scanner)
+            self.assertEqual(scanner.listed, [changed])
+            self.assertIn(
+                os.path.join(changed, "new.sublime-project"),
+                index.files(root, ".sublime-project"),
+            )
+            self.assertEqual(
+                changes[-1], {os.path.join(changed, "new.sublime-project")}
+            )
+            index.flush()
+
+    def test_upgrade_workspaces(self):
+        with tempfile.TemporaryDirectory() as directory:
+            project = os.path.join(directory, "real.sublime-project")
+            linked = os.path.join(directory, "linked.sublime-workspace")
+            empty = os.path.join(directory, "empty.sublime-workspace")
+            broken = os.path.join(directory, "broken.sublime-workspace")
+            for path, content in (
+                (project, "{}"),
+                (linked, '{\n\t"project": "real.sublime-project"\n}'),
+                (empty, '{"project": null}'),
+                (broken, "not json"),
+            ):
+                with open(path, "w") as outfile:
+                    outfile.write(content)
+
+            upgraded, failed = workspace.upgrade_all([linked, empty, broken])
+
+            self.assertEqual(
+                upgraded,
+                [
+                    empty.replace(".sublime-workspace", ".sublime-project"),
+                    linked.replace(".sublime-workspace", ".sublime-project"),
+                ],
+            )
+            self.assertEqual([path for path, error in failed], [broken])
+            self.assertTrue(os.path.samefile(project, upgraded[1]))
+            with open(linked) as infile:
+                self.assertEqual(json.load(infile)["project"], upgraded[1])
+
+    def test_project_search(self):
+        with tempfile.TemporaryDirectory() as directory:
+            recent = search.RecentProjects(os.path.join(directory, "recent.json"))
+            index = search.ProjectSearch(recent)
+            tools = "/src/beta-tools/beta-tools.sublime-project"
+            alpha = "/src/alpha/alpha.sublime-project"
+            alphabet = "/src/alphabet/alphabet.sublime-project"
+            index.add([tools, alpha, alphabet])
+
+            self.assertEqual(index.search("alpha")[:2], [alpha, alphabet])
+            self.assertEqual(index.search("bt"), [tools])
+            # a typo still finds it
+            self.assertEqual(index.search("alphbet")[0], alphabet)
+
+            # recent use breaks the tie between equally good matches
+            recent.touch([alphabet])
+            self.assertEqual(index.search("alp")[0], alphabet)
+            self.assertEqual(index.search(""), [alphabet])
+
+            index.discard([alphabet])
+            self.assertEqual(index.search("alp"), [alpha])
+
+    def test_timings_summary(self):
+        class Scratch(timings.Timings):
+            samples = timings.deque(maxlen=100)
+
+        for ms in range(1, 101):
+            Scratch.record("open_project", ms / 1000, "slow.sublime-project")
+        Scratch.record("open_project", 0.001, "fast.sublime-project")
+
+        summary = Scratch.summary()
+        stats = summary["phases"]["open_project"]
+        # the ring only holds the last 100
+        self.assertEqual(stats["count"], 100)
+        self.assertAlmostEqual(stats["p50"], 0.05)
+        self.assertAlmostEqual(stats["p95"], 0.095)
+        self.assertEqual(summary["slowest"][0][0], "slow.sublime-project")
+
     def remove_project_menu(self, constellation):
         handle = input_handlers.ConstellationProjectList()
-        return handle.next_input({"constellation": constellation}).list_items()
+        items = handle.next_input({"constellation": constellation}).list_items()
+        # ST4 gets ListInputItems (for the annotations); compare as (label, path)
+        return [
+            (item.text, item.value) if hasattr(item, "value") else item
+            for item in items
+        ]
 
     def remove_project_menu_contains(self, constellation, projects):
         # make sure the remove menu has the right projects:
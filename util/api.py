@@ -1,27 +1,109 @@
 import sublime
+import copy
 import os
+import threading
 import time
+from collections import Counter
+from contextlib import contextmanager
 from . import constants as c
-from .subl import subl
+from .opener import BatchProjectOpener, ProjectOpener
+from .closer import WindowCloser
+from .discovery import ProjectIndex, Scanner
+from .watcher import watcher_for
+from .journal import Journal
+from .catalog import Catalog
+from .search import ProjectSearch, RecentProjects
+from .timings import Timings
 
 
 class API:
-    state = cache_dir = open_constellation_cache = None
+    state = cache_dir = open_constellation_cache = project_index_cache = None
     _open_constellations = set()
+    watcher = journal = recent = None
+    # fuzzy project search, built on first use
+    _search = None
+    _search_lock = threading.Lock()
+    # constellations as of the last write, for journaling the difference
+    _persisted = {}
+    # write-behind: which files need writing, and the latest scheduled flush
+    _dirty = set()
+    _flush_generation = 0
+    _flush_lock = threading.Lock()
+    # working copy of constellations while a batch() is open
+    _batch = None
+    # project path -> names of the constellations that include it
+    _project_constellations = {}
+    # the constellations the index reflects, to spot hand edits to the settings
+    _indexed = None
+    # set while we write constellations ourselves
+    _setting = False
+    # project path -> how many open constellations include it
+    _open_refs = Counter()
+    # project path -> {window id: window} for windows showing that project
+    _project_windows = {}
+    # window id -> the project it's showing
+    _window_projects = {}
+    # bumped whenever the window maps change; open projects are cached until then
+    _windows_version = 0
+    _open_projects = (-1, [])
+    # open constellation -> its lazy projects, still waiting for the editor to idle
+    _lazy = {}
+    # time.monotonic() of the last edit, selection or focus change
+    _last_activity = 0.0
+    # bumped on every mutation; derived views are cached until it moves
+    _version = 0
+    _views = {}
+    _views_version = -1
 
     @classmethod
-    def load_state(cls, settings_file=None):
-        cls.state = sublime.load_settings(settings_file or c.PLUGIN_SETTINGS_FILE) or {}
+    def load_state(cls, settings_file=None, defer=False):
+        """
+        Load settings, then restore the rest of our state.
 
-        constellations = cls.state.get("constellations", {})
+        With defer=True, only the cheap part happens now and restore_state
+        runs on the async thread, keeping it off the editor's startup path.
+        """
+        cls.state = sublime.load_settings(settings_file or c.PLUGIN_SETTINGS_FILE) or {}
 
         if not cls.cache_dir:
             cls.cache_dir = os.path.join(sublime.cache_path(), c.PLUGIN_NAME)
             cls.open_constellation_cache = os.path.join(
                 cls.cache_dir, "open_constellations"
             )
-            if not os.path.isdir(cls.cache_dir):
-                os.mkdir(cls.cache_dir)
+            cls.project_index_cache = os.path.join(cls.cache_dir, "project_index.json")
+
+        # hand edits to the settings file land here too
+        cls.state.clear_on_change(c.PLUGIN_NAME)
+        cls.state.add_on_change(c.PLUGIN_NAME, cls.settings_changed)
+
+        if defer:
+            sublime.set_timeout_async(cls.restore_state, 0)
+        else:
+            cls.restore_state()
+
+    @classmethod
+    def restore_state(cls):
+        """Read the open-constellation cache, migrate if needed, and index."""
+        started = time.perf_counter()
+        constellations = cls.state.get("constellations", {})
+
+        os.makedirs(cls.cache_dir, exist_ok=True)
+
+        if cls.state.get("storage", "settings") == "journal":
+            cls.journal = Journal(cls.cache_dir, cls.state.get("journal_compact_after"))
+            if cls.journal.exists():
+                constellations = cls.journal.load()
+                cls.state.set("constellations", constellations)
+            else:
+                # first run on the journal; start from the settings file
+                cls.journal.compact(constellations)
+        API._persisted = copy.deepcopy(constellations)
+
+        cls.recent = RecentProjects(os.path.join(cls.cache_dir, "recent_projects.json"))
+        cls.recent.load()
+        Timings.load(
+            os.path.join(cls.cache_dir, "timings.json"), cls.state.get("timings_kept")
+        )
 
         try:
             with open(cls.open_constellation_cache) as cache:
@@ -33,6 +115,177 @@ class API:
 
         if not cls.state.get("did_migrate_open", False):
             cls.do_migrate_open(constellations)
+            # record it, so we never do this again
+            cls.schedule_save()
+
+        cls.rebuild_index(constellations)
+        cls.track_windows()
+        cls.bump()
+        Timings.record("restore_state", time.perf_counter() - started)
+        print(
+            c.LOG_TEMPLATE,
+            "Restored state in {:.1f}ms".format((time.perf_counter() - started) * 1000),
+        )
+
+    @classmethod
+    def settings_changed(cls):
+        cls.bump()
+        if API._setting or cls.state is None:
+            # our own write; the index already follows it
+            return
+        constellations = cls.state.get("constellations", {})
+        if constellations != API._indexed:
+            # edited by hand; forget constellations that have gone, and reindex
+            API._open_constellations.intersection_update(constellations.keys())
+            cls.rebuild_index(constellations)
+
+    @classmethod
+    def bump(cls):
+        API._version += 1
+
+    @classmethod
+    def view(cls, key, build):
+        """build(), cached until the next mutation"""
+        if API._views_version != API._version:
+            API._views = {}
+            API._views_version = API._version
+        if key not in API._views:
+            API._views[key] = build()
+        return API._views[key]
+
+    def snapshot(self):
+        """Read-only constellations, cached until the next mutation"""
+        if API._batch is not None:
+            return API._batch
+        return self.view("constellations", lambda: self.constellations)
+
+    @classmethod
+    def rebuild_index(cls, constellations=None):
+        if constellations is None:
+            constellations = cls.state.get("constellations", {})
+        index = {}
+        refs = Counter()
+        for name, settings in constellations.items():
+            for project in settings["projects"]:
+                index.setdefault(project, set()).add(name)
+                if name in cls._open_constellations:
+                    refs[project] += 1
+        API._project_constellations = index
+        API._open_refs = refs
+        API._indexed = constellations
+
+    @classmethod
+    def ref(cls, project, delta):
+        API._open_refs[project] += delta
+        if API._open_refs[project] <= 0:
+            del API._open_refs[project]
+
+    @classmethod
+    def track_windows(cls):
+        """Rebuild the project -> windows map in one pass over sublime.windows()"""
+        tracked, projects = {}, {}
+        for window in sublime.windows():
+            project = window.project_file_name()
+            if project:
+                tracked.setdefault(project, {})[window.id()] = window
+                projects[window.id()] = project
+        API._project_windows = tracked
+        API._window_projects = projects
+        API._windows_version += 1
+
+    @classmethod
+    def track_window(cls, project, window):
+        cls.untrack_window(window)
+        API._project_windows.setdefault(project, {})[window.id()] = window
+        API._window_projects[window.id()] = project
+        API._windows_version += 1
+
+    @classmethod
+    def untrack_window(cls, window):
+        """Forget window; returns the project it was showing, if any"""
+        project = API._window_projects.pop(window.id(), None)
+        windows = API._project_windows.get(project)
+        if windows is not None:
+            windows.pop(window.id(), None)
+            if not windows:
+                del API._project_windows[project]
+        API._windows_version += 1
+        return project
+
+    @staticmethod
+    def follows_windows():
+        """Whether window events (ST4) keep the window maps current"""
+        return int(sublime.version()) >= 4050
+
+    @classmethod
+    def track_opened(cls, opener):
+        for project, window in opener.windows.items():
+            cls.track_window(project, window)
+        cls.schedule_save("timings")
+
+    @classmethod
+    def track_closed(cls, closer):
+        # window events cover this on ST4; ST3 only hears it from us
+        for window in closer.windows:
+            cls.untrack_window(window)
+        cls.schedule_save("timings")
+
+    def windows_for(self, projects):
+        """
+        Windows showing any of projects, straight from the map. Window events
+        keep it current on ST4; on ST3 we resync once if any project is
+        missing, in case it was opened behind our back.
+        """
+        projects = list(projects)
+        if not self.follows_windows() and any(
+            project not in self._project_windows for project in projects
+        ):
+            self.track_windows()
+        return [
+            window
+            for project in projects
+            for window in self._project_windows.get(project, {}).values()
+            if window.project_file_name() == project
+        ]
+
+    def project_loaded(self, window):
+        """
+        A window picked up a project; just track it. Constellations only open
+        when asked, even if every one of their projects happens to be open.
+        """
+        project = window.project_file_name()
+        if project:
+            self.track_window(project, window)
+
+    def project_closing(self, window):
+        """A window is dropping its project; the last one out closes the constellation."""
+        project = self.untrack_window(window)
+        if not project:
+            return
+
+        for name in self.constellations_for(project) & self._open_constellations:
+            if not any(p in self._project_windows for p in self.projects_for(name)):
+                self.close_constellation(name)
+
+    def closable_projects(self, name):
+        """Projects of name that no other open constellation still uses"""
+        return [
+            project
+            for project in self.projects_for(name)
+            if self._open_refs.get(project, 0) <= 1
+        ]
+
+    @classmethod
+    def index_add(cls, name, project):
+        API._project_constellations.setdefault(project, set()).add(name)
+
+    @classmethod
+    def index_discard(cls, name, project):
+        names = API._project_constellations.get(project)
+        if names is not None:
+            names.discard(name)
+            if not names:
+                del API._project_constellations[project]
 
     @classmethod
     def do_migrate_open(cls, constellations):
@@ -44,61 +297,197 @@ class API:
 
         cls.state.set("constellations", constellations)
         cls.state.set("did_migrate_open", True)
+        cls.bump()
 
     @classmethod
     def save_state(cls, settings_file=None):
-        sublime.save_settings(settings_file or c.PLUGIN_SETTINGS_FILE)
-        with open(cls.open_constellation_cache, mode="w") as cache:
-            cache.write(
-                "\n".join(
-                    cls._open_constellations
-                    & cls.state.get("constellations", {}).keys()
-                )
-            )
+        """Write everything now, superseding any pending write-behind flush."""
+        with cls._flush_lock:
+            dirty = API._dirty | {"constellations", "cache", "recent", "timings"}
+            API._dirty = set()
+            cls.write(dirty, settings_file)
+
+    @classmethod
+    def export_state(cls, settings_file=None):
+        """Write constellations to the settings file, whatever the storage"""
+        with cls._flush_lock:
+            sublime.save_settings(settings_file or c.PLUGIN_SETTINGS_FILE)
+
+    @classmethod
+    def schedule_save(cls, *which):
+        """
+        Mark constellations, other settings, the open-constellation cache,
+        recent project use and/or timings for writing.
+
+        Writes happen off the main thread once mutations have been quiet for
+        save_delay ms, so a burst of changes costs a single write.
+        """
+        with cls._flush_lock:
+            API._dirty.update(which or ("constellations", "settings", "cache"))
+            API._flush_generation += 1
+            generation = API._flush_generation
+
+        sublime.set_timeout_async(
+            lambda: cls.flush(generation), cls.state.get("save_delay", 500)
+        )
+
+    @classmethod
+    def flush(cls, generation=None):
+        """Write anything dirty; a flush for a stale generation is a no-op."""
+        with cls._flush_lock:
+            if generation is not None and generation != API._flush_generation:
+                # superseded by a later mutation, which has its own flush queued
+                return
+            dirty, API._dirty = API._dirty, set()
+            cls.write(dirty)
+
+    @classmethod
+    def write(cls, dirty, settings_file=None):
+        with Timings.timed("save"):
+            cls.write_now(dirty, settings_file)
+        if "timings" in dirty:
+            Timings.save()
+
+    @classmethod
+    def write_now(cls, dirty, settings_file=None):
+        if "constellations" in dirty:
+            if cls.journal:
+                current = cls.state.get("constellations", {})
+                cls.journal.record(API._persisted, current)
+                API._persisted = current
+            else:
+                # they live in the settings file
+                dirty = dirty | {"settings"}
+
+        if "settings" in dirty:
+            sublime.save_settings(settings_file or c.PLUGIN_SETTINGS_FILE)
+        if "cache" in dirty:
+            cls.save_constellation_cache()
+        if "recent" in dirty and cls.recent:
+            cls.recent.save()
 
     @property
     def constellations(self):
+        if API._batch is not None:
+            return API._batch
         return self.state.get("constellations", {})
 
     @constellations.setter
     def constellations(self, value):
-        self.state.set("constellations", value)
-        self.save_state()
+        if API._batch is not None:
+            # held until the batch commits
+            API._batch = value
+            return
+        API._setting = True
+        try:
+            self.state.set("constellations", value)
+        finally:
+            API._setting = False
+        # the index was kept up as value was built
+        API._indexed = value
+        self.bump()
+        self.schedule_save("constellations", "cache")
+
+    @contextmanager
+    def batch(self):
+        """
+        Apply many mutations to one working copy; validate and save once.
+
+        Nested batches join the outermost one. If the block raises, nothing
+        it did is kept, open/closed state (which renames and removals touch
+        directly) included.
+        """
+        if API._batch is not None:
+            yield API._batch
+            return
+
+        API._batch = self.state.get("constellations", {})
+        was_open = set(API._open_constellations)
+        was_lazy = {name: list(projects) for name, projects in API._lazy.items()}
+        try:
+            yield API._batch
+            defined = self.validate(API._batch)
+        except BaseException:
+            API._batch = None
+            API._open_constellations.clear()
+            API._open_constellations.update(was_open)
+            API._lazy = was_lazy
+            # the index followed the abandoned working copy; resync it
+            self.rebuild_index()
+            self.bump()
+            self.schedule_save("cache")
+            raise
+        API._batch = None
+        self.constellations = defined
+
+    @staticmethod
+    def validate(constellations):
+        for name, settings in constellations.items():
+            if not name or not isinstance(settings, dict):
+                raise ValueError("Invalid constellation: {!r}".format(name))
+            settings.setdefault("archived", False)
+            # drop duplicates, keeping the first occurrence's position (dicts
+            # aren't ordered on 3.3, so no dict.fromkeys)
+            seen = set()
+            projects = []
+            for project in settings.get("projects", []):
+                if project not in seen:
+                    seen.add(project)
+                    projects.append(project)
+            settings["projects"] = projects
+            # and priorities/lazy flags for projects that have gone
+            if "priority" in settings:
+                priorities = {}
+                for project, priority in settings["priority"].items():
+                    try:
+                        priority = int(priority)
+                    except (TypeError, ValueError):
+                        # hand-edited into something that isn't a number
+                        continue
+                    if project in seen and priority:
+                        priorities[project] = priority
+                settings["priority"] = priorities
+            if "lazy" in settings:
+                settings["lazy"] = [p for p in settings["lazy"] if p in seen]
+        return constellations
 
     def open_constellations(self):
-        """Open"""
-        return list(self._open_constellations)
+        """Open, sorted (menu slots index into this)"""
+        return self.view("open", lambda: sorted(self._open_constellations))
 
     @property
     def open_projects(self):
-        """Open"""
-        return list(
-            set(
-                [
-                    win.project_file_name()
-                    for win in sublime.windows()
-                    if win.project_file_name()
-                ]
+        """Open, sorted by label"""
+        if not self.follows_windows():
+            # nothing tells us about windows on ST3; ask each one
+            projects = (win.project_file_name() for win in sublime.windows())
+            return [info.path for info in Catalog.sorted(filter(None, projects))]
+
+        if API._open_projects[0] != API._windows_version:
+            projects = API._window_projects.values()
+            API._open_projects = (
+                API._windows_version,
+                [info.path for info in Catalog.sorted(projects)],
             )
-        )
+        return API._open_projects[1]
 
     def closed_constellations(self):
         """Active, but not open"""
-        return self.active_constellations() - self._open_constellations
+        return self.view(
+            "closed", lambda: self.active_constellations() - self._open_constellations
+        )
 
     def archived_constellations(self):
-        return {
-            k
-            for k, v in self.state.get("constellations", {}).items()
-            if v.get("archived")
-        }
+        return self.view(
+            "archived",
+            lambda: {k for k, v in self.snapshot().items() if v.get("archived")},
+        )
 
     def active_constellations(self):
-        return {
-            k
-            for k, v in self.state.get("constellations", {}).items()
-            if not v.get("archived")
-        }
+        return self.view(
+            "active",
+            lambda: {k for k, v in self.snapshot().items() if not v.get("archived")},
+        )
 
     @property
     def search_path(self):
@@ -107,43 +496,277 @@ class API:
     @search_path.setter
     def search_path(self, value):
         self.state.set("search_path", value)
-        self.save_state()
+        self.schedule_save("settings")
+        self.watch()
+
+    @property
+    def search_roots(self):
+        """search_path plus any extra search_paths that exist"""
+        roots = [self.search_path] + list(self.state.get("search_paths", []))
+        return [
+            os.path.expanduser(root)
+            for root in roots
+            if root and os.path.isdir(os.path.expanduser(root))
+        ]
+
+    def scanner(self):
+        return Scanner(
+            ignore=self.state.get("search_ignore"),
+            depth=self.state.get("search_depth"),
+            workers=self.state.get("search_workers"),
+        )
+
+    def watching(self, root):
+        return bool(
+            API.watcher and API.watcher.is_alive() and root in API.watcher.roots
+        )
+
+    def watch(self):
+        """(Re)start the background watcher that keeps the index warm."""
+        self.unwatch()
+        if not self.state.get("watch_search_paths", True) or not self.search_roots:
+            return
+        API.watcher = watcher_for(
+            ProjectIndex.at(self.project_index_cache),
+            self.search_roots,
+            self.scanner(),
+            interval=self.state.get("watch_interval"),
+        )
+        API.watcher.start()
+
+    def unwatch(self):
+        if API.watcher:
+            API.watcher.stop()
+            API.watcher = None
+
+    def project_search(self, known=None):
+        """
+        Every project we know of, indexed for fuzzy search; built once.
+
+        Off the main thread, pass known: a copy of projects_in_constellations()
+        taken on it, since the live view changes under mutations there.
+        """
+        with API._search_lock:
+            if API._search is None:
+                if known is None:
+                    known = list(self.projects_in_constellations())
+                search = ProjectSearch(self.recent)
+                # listen first, so nothing found mid-build slips past
+                ProjectIndex.at(self.project_index_cache).listeners.append(
+                    search.update
+                )
+                found, pending = self.discover(c.PROJECT_SUFFIX, budget=0)
+                search.add(path for label, path in found)
+                search.add(known)
+                API._search = search
+        return API._search
+
+    def used(self, projects):
+        """Note that projects were just used in a constellation, for ranking"""
+        if self.recent and projects:
+            self.recent.touch(projects)
+            self.schedule_save("recent")
+
+    def discover(self, suffix, budget=None):
+        """
+        (label, path) for project/workspace files, served from the index.
+
+        Roots we haven't indexed yet get scanned in the background; we give
+        that up to budget (default: stream_budget) seconds and return whatever
+        has turned up so far, along with whether any scan is still pending.
+        """
+        with Timings.timed("discover"):
+            return self.discover_now(suffix, budget)
+
+    def discover_now(self, suffix, budget):
+        index = ProjectIndex.at(self.project_index_cache)
+        roots = self.search_roots
+        for root in roots:
+            if not self.watching(root):
+                # answer from the index now; pick up any changes for next time
+                index.refresh_in_background(root, self.scanner())
+
+        if budget is None:
+            budget = self.state.get("stream_budget", 0.3)
+        deadline = time.monotonic() + budget
+        pending = False
+        for root in roots:
+            if not index.wait(root, max(0, deadline - time.monotonic())):
+                pending = True
+
+        found = []
+        for root in roots:
+            found.extend(
+                (Catalog.info(path).under(root), path)
+                for path in index.files(root, suffix)
+            )
+        return found, pending
+
+    def upgradable_workspaces(self, budget=None):
+        """Workspaces that don't have an adjacent .sublime-project yet."""
+        found, pending = self.discover(c.WORKSPACE_SUFFIX, budget)
+        workspaces = [
+            (label, path)
+            for label, path in found
+            if not os.path.exists(path.replace(c.WORKSPACE_SUFFIX, c.PROJECT_SUFFIX))
+        ]
+        return workspaces, pending
 
     def add_constellation(self, name):
         defined = self.constellations
+        for project in defined.get(name, {}).get("projects", []):
+            self.index_discard(name, project)
+            if name in self._open_constellations:
+                self.ref(project, -1)
         defined[name] = {"archived": False, "projects": []}
         self.constellations = defined
         # print(c.LOG_TEMPLATE, "Created constellation:", name)
 
     def remove_constellation(self, name):
+        if name in self._open_constellations:
+            self.close_constellation(name)
         defined = self.constellations
+        for project in defined[name]["projects"]:
+            self.index_discard(name, project)
         del defined[name]
         self.constellations = defined
         # print(c.LOG_TEMPLATE, "Removed constellation:", name)
 
     @classmethod
     def save_constellation_cache(cls):
-        with open(cls.open_constellation_cache, mode="w") as cache:
+        # write aside and swap in, so a crash mid-write can't truncate the cache
+        with open(cls.open_constellation_cache + ".tmp", mode="w") as cache:
+            # copy first; this can run on the async thread mid-mutation
             for line in (
-                cls._open_constellations & cls.state.get("constellations", {}).keys()
+                set(cls._open_constellations)
+                & cls.state.get("constellations", {}).keys()
             ):
                 cache.write(line + "\n")
+        os.replace(cls.open_constellation_cache + ".tmp", cls.open_constellation_cache)
 
     def open_constellation(self, name):
         if name in self._open_constellations:
             return
 
-        self._open_constellations.add(name)
-        self.save_constellation_cache()
+        self.mark_open(name)
+        self.used(self.projects_for(name))
         # print(c.LOG_TEMPLATE, "Opened constellation:", name)
+        # launch off the main thread, waiting on each window instead of a fixed pause
+        eager, lazy = self.open_order(name)
+        self.opener_for(eager).start()
+        if lazy:
+            API._lazy[name] = lazy
+            self.open_when_idle(name)
+
+    def switch_constellation(self, name):
+        """
+        Make name the only open constellation, touching only the difference:
+        windows name still needs stay put, windows nothing needs any more
+        close, and only projects without a window get launched.
+        """
+        leaving = self._open_constellations - {name}
+        wanted = set(self.projects_for(name))
+        unneeded = {
+            project
+            for other in leaving
+            for project in self.projects_for(other)
+            if project not in wanted
+        }
+        windows = self.windows_for(unneeded)
+        reused = [project for project in wanted if project in self._project_windows]
+
+        for other in leaving:
+            self.close_constellation(other)
+        if name in self._open_constellations:
+            print(c.LOG_TEMPLATE, "Switched to", name, "(already open)")
+        else:
+            # the opener reuses windows that already show a project
+            self.open_constellation(name)
+            print(
+                c.LOG_TEMPLATE,
+                "Switched to {}: kept {} windows, opening {} projects".format(
+                    name, len(reused), len(wanted) - len(reused)
+                ),
+            )
+        # only keep an emptied window if name won't bring any of its own
+        self.closer_for(windows, keep_active=not wanted).start()
+
+    def open_order(self, name):
+        """name's projects, highest priority first, split into (eager, lazy)"""
+        settings = self.snapshot()[name]
+        priority = settings.get("priority", {})
+        lazy = set(settings.get("lazy", ()))
+        # sorted() is stable, so equal priorities keep their list order
+        ordered = sorted(settings["projects"], key=lambda p: -priority.get(p, 0))
+        return (
+            [project for project in ordered if project not in lazy],
+            [project for project in ordered if project in lazy],
+        )
+
+    @classmethod
+    def active(cls):
+        """The user did something; lazy projects wait until they stop"""
+        API._last_activity = time.monotonic()
+
+    def open_when_idle(self, name):
+        idle = self.state.get("lazy_idle", 2000) / 1000
+
+        def check():
+            if name not in API._lazy:
+                # opened on demand, or closed, in the meantime
+                return
+            quiet = time.monotonic() - API._last_activity
+            if quiet < idle:
+                sublime.set_timeout(check, int((idle - quiet) * 1000) + 1)
+            else:
+                self.open_lazy(name)
+
+        sublime.set_timeout(check, int(idle * 1000))
+
+    def open_lazy(self, name):
+        """Open whatever lazy projects name is still holding back"""
+        projects = API._lazy.pop(name, [])
+        if projects and name in self._open_constellations:
+            self.opener_for(projects).start()
+
+    def mark_open(self, name):
+        """Record name as open without opening anything"""
+        self._open_constellations.add(name)
         for project in self.projects_for(name):
-            subl("-n", project)
-            # sometimes multiple projects don't open right; this superstitious pause seems to help.
-            time.sleep(0.200)
+            self.ref(project, 1)
+        self.bump()
+        self.schedule_save("cache")
+
+    def opener_for(self, projects):
+        if self.state.get("batch_launch", False):
+            return BatchProjectOpener(
+                projects,
+                in_flight=self.state.get("open_in_flight"),
+                timeout=self.state.get("open_timeout"),
+                backend=self.state.get("open_backend", "auto"),
+                on_done=self.track_opened,
+            )
+        return ProjectOpener(
+            projects,
+            in_flight=self.state.get("open_in_flight"),
+            timeout=self.state.get("open_timeout"),
+            backend=self.state.get("open_backend", "auto"),
+            on_done=self.track_opened,
+        )
+
+    def closer_for(self, windows, keep_active=True):
+        return WindowCloser(windows, keep_active=keep_active, on_done=self.track_closed)
 
     def close_constellation(self, name):
+        if name not in self._open_constellations:
+            # window events may have beaten us to it
+            return
         self._open_constellations.remove(name)
-        self.save_constellation_cache()
+        API._lazy.pop(name, None)
+        for project in self.projects_for(name):
+            self.ref(project, -1)
+        self.bump()
+        self.schedule_save("cache")
         # print(c.LOG_TEMPLATE, "Closed constellation:", name)
 
     def archive_constellation(self, name):
@@ -158,32 +781,123 @@ class API:
 
     def rename_constellation(self, name, new_name):
         defined = self.constellations
+        if new_name == name:
+            return
+        # renaming over another constellation replaces it, as add_constellation does
+        for project in defined.get(new_name, {}).get("projects", []):
+            self.index_discard(new_name, project)
+            if new_name in self._open_constellations:
+                self.ref(project, -1)
+        if new_name in self._open_constellations:
+            # its windows stay; whether new_name is open is now up to name
+            self._open_constellations.discard(new_name)
+            API._lazy.pop(new_name, None)
+            self.schedule_save("cache")
         defined[new_name] = defined[name]
         del defined[name]
+        for project in defined[new_name]["projects"]:
+            self.index_discard(name, project)
+            self.index_add(new_name, project)
+        if name in self._open_constellations:
+            self._open_constellations.discard(name)
+            self._open_constellations.add(new_name)
+            if name in API._lazy:
+                API._lazy[new_name] = API._lazy.pop(name)
+            self.schedule_save("cache")
         self.constellations = defined
         # print(c.LOG_TEMPLATE, "Renamed constellation:", name, "->", new_name)
 
     def projects_for(self, name):
-        return self.constellations[name]["projects"]
+        return self.snapshot()[name]["projects"]
 
     def projects_in_constellations(
         self,
     ):
-        return {p for k, v in self.constellations.items() for p in v["projects"]}
+        """Every project in some constellation (a live, set-like view)"""
+        return self._project_constellations.keys()
+
+    def constellations_for(self, project):
+        """Names of the constellations that include project"""
+        return frozenset(self._project_constellations.get(project, ()))
+
+    def in_constellation(self, name, project):
+        return name in self._project_constellations.get(project, ())
 
     def add_to(self, name, project, already_open=False):
-        if name and project:
+        if name and project and not self.in_constellation(name, project):
             defined = self.constellations
             defined[name]["projects"].append(project)
             self.constellations = defined
+            self.index_add(name, project)
+            if name in self._open_constellations:
+                self.ref(project, 1)
+            if API._batch is None:
+                # batches note theirs all at once
+                self.used([project])
             # print(c.LOG_TEMPLATE, "Add project:", project, "to", name)
             if not already_open and name in self._open_constellations:
                 # open it, if the constellation is
-                subl("-n", project)
+                self.opener_for([project]).start()
 
     def remove_from(self, name, project):
-        if name and project:
+        if name and project and self.in_constellation(name, project):
             defined = self.constellations
             defined[name]["projects"].remove(project)
+            self.drop_flags(defined[name], project)
             self.constellations = defined
+            self.index_discard(name, project)
+            if name in self._open_constellations:
+                self.ref(project, -1)
             # print(c.LOG_TEMPLATE, "Remove project:", project, "from", name)
+
+    @staticmethod
+    def drop_flags(settings, project):
+        """Forget project's priority and lazy flag, and any emptied containers"""
+        settings.get("priority", {}).pop(project, None)
+        if project in settings.get("lazy", ()):
+            settings["lazy"].remove(project)
+        for key in ("priority", "lazy"):
+            if key in settings and not settings[key]:
+                del settings[key]
+
+    def set_priority(self, name, project, priority):
+        """Higher priorities open first; 0 (the default) drops it"""
+        defined = self.constellations
+        priorities = defined[name].setdefault("priority", {})
+        if priority:
+            priorities[project] = priority
+        else:
+            priorities.pop(project, None)
+        if not priorities:
+            del defined[name]["priority"]
+        self.constellations = defined
+
+    def set_lazy(self, name, project, lazy=True):
+        """Lazy projects open once the editor goes idle, or on demand"""
+        defined = self.constellations
+        flagged = defined[name].setdefault("lazy", [])
+        if lazy and project not in flagged:
+            flagged.append(project)
+        elif not lazy and project in flagged:
+            flagged.remove(project)
+        if not flagged:
+            del defined[name]["lazy"]
+        self.constellations = defined
+
+    def add_projects(self, name, projects, already_open=False):
+        added = []
+        with self.batch():
+            for project in projects:
+                if project and not self.in_constellation(name, project):
+                    self.add_to(name, project, already_open=True)
+                    added.append(project)
+        self.used(added)
+
+        if added and not already_open and name in self._open_constellations:
+            self.opener_for(added).start()
+        return added
+
+    def remove_projects(self, name, projects):
+        with self.batch():
+            for project in list(projects):
+                self.remove_from(name, project)
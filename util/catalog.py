@@ -0,0 +1,69 @@
+"""
+What the project pickers show for each project, worked out once per path.
+
+A project's label, annotation and sort key all follow from its path, so we
+compute them the first time a path turns up and keep them for the session.
+Which projects are open comes from API's window map (window id -> project),
+which window events keep current; opening a picker doesn't have to ask every
+window what it's showing.
+"""
+
+import sublime
+
+import os
+from operator import attrgetter
+
+# ListInputItem (and with it, annotations) arrived in ST4
+ListInputItem = getattr(sublime, "ListInputItem", None)
+
+
+class ProjectInfo:
+    __slots__ = ("path", "label", "annotation", "sort_key", "relative", "items")
+
+    def __init__(self, path):
+        self.path = path
+        self.label = os.path.basename(path)
+        # the enclosing directory tells same-named projects apart
+        self.annotation = os.path.basename(os.path.dirname(path))
+        self.sort_key = (self.label.lower(), path)
+        self.relative = {}  # search root -> label relative to it
+        self.items = {}  # label -> picker item
+
+    def under(self, root):
+        """Label relative to a search root, as the search pickers show it"""
+        if root not in self.relative:
+            self.relative[root] = self.path.replace(root, "..")
+        return self.relative[root]
+
+    def item(self, label=None):
+        label = label or self.label
+        if label not in self.items:
+            if ListInputItem:
+                self.items[label] = ListInputItem(
+                    label, self.path, annotation=self.annotation
+                )
+            else:
+                self.items[label] = (label, self.path)
+        return self.items[label]
+
+
+class Catalog:
+    _info = {}
+
+    @classmethod
+    def info(cls, path):
+        info = cls._info.get(path)
+        if info is None:
+            info = cls._info[path] = ProjectInfo(path)
+        return info
+
+    @classmethod
+    def sorted(cls, paths):
+        return sorted(
+            (cls.info(path) for path in set(paths)), key=attrgetter("sort_key")
+        )
+
+    @classmethod
+    def items(cls, paths, exclude=()):
+        """Picker items for paths, de-duplicated and sorted by label"""
+        return [info.item() for info in cls.sorted(paths) if info.path not in exclude]
@@ -0,0 +1,71 @@
+"""
+Close a batch of windows in one pass.
+
+Closing windows one at a time, and checking which one is active after each,
+has the editor relayout and hand focus around on every close. Instead we work
+out up front which window (if any) should survive, close everything else in a
+single pass on the main thread, and put focus back once at the end.
+"""
+
+import sublime
+
+import time
+
+from . import constants as c
+from .timings import Timings
+
+
+def is_valid(window):
+    # Window.is_valid arrived in ST4
+    return getattr(window, "is_valid", lambda: True)()
+
+
+class WindowCloser:
+    def __init__(self, windows, keep_active=True, on_done=None):
+        # the same window can turn up under more than one project
+        self.windows = list({window.id(): window for window in windows}.values())
+        self.keep_active = keep_active
+        self.on_done = on_done
+        self.keep = self.focus = None
+        self.closed = 0
+        self.started = self.elapsed = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        active = sublime.active_window()
+        closing_active = any(window.id() == active.id() for window in self.windows)
+        if closing_active and self.keep_active:
+            # don't leave the user without a window; just empty this one
+            self.keep = active
+        elif not closing_active:
+            self.focus = active
+        sublime.set_timeout(self.run, 0)
+
+    def run(self):
+        for window in self.windows:
+            if self.keep and window.id() == self.keep.id():
+                continue
+            if not is_valid(window):
+                continue
+            with Timings.timed("close_window", window.project_file_name()):
+                window.run_command("close_workspace")
+                window.run_command("close_window")
+            self.closed += 1
+
+        if self.keep:
+            self.keep.run_command("close_workspace")
+            self.closed += 1
+
+        focus = self.keep or self.focus
+        if focus and is_valid(focus) and hasattr(focus, "bring_to_front"):
+            focus.bring_to_front()
+
+        self.elapsed = time.perf_counter() - self.started
+        if self.windows:
+            Timings.record("close_windows", self.elapsed)
+        print(
+            c.LOG_TEMPLATE,
+            "Closed {} windows in {:.1f}ms".format(self.closed, self.elapsed * 1000),
+        )
+        if self.on_done:
+            self.on_done(self)
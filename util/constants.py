@@ -1,3 +1,6 @@
 PLUGIN_NAME = "Constellation"
 PLUGIN_SETTINGS_FILE = "{}.sublime-settings".format(PLUGIN_NAME)
 LOG_TEMPLATE = "{}:".format(PLUGIN_NAME)
+PROJECT_SUFFIX = ".sublime-project"
+WORKSPACE_SUFFIX = ".sublime-workspace"
+STILL_SEARCHING = "{}:still-searching".format(PLUGIN_NAME)
@@ -0,0 +1,295 @@
+"""
+Find .sublime-project and .sublime-workspace files under the search path.
+
+Rather than walking the whole tree every time a panel opens, we keep an index
+on disk of each directory we've seen: its mtime, the project/workspace files
+in it, and its subdirectories. A directory's mtime only changes when entries
+are added to or removed from it, so a refresh just has to stat each known
+directory and re-list the ones that changed.
+
+The walk itself is pure python (os.scandir, or listdir and lstat on ST3's
+python 3.3), fans out across a thread pool, and skips directories matching the
+ignore globs.
+"""
+
+import fnmatch
+import json
+import os
+import stat
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from . import constants as c
+
+SUFFIXES = (c.PROJECT_SUFFIX, c.WORKSPACE_SUFFIX)
+
+
+class Scanner:
+    ignore = (
+        ".git",
+        ".hg",
+        ".svn",
+        "node_modules",
+        "bower_components",
+        "__pycache__",
+        ".venv",
+        "venv",
+        ".tox",
+        "build",
+        "dist",
+        "target",
+    )
+    depth = 5
+    workers = 8
+    fan_out = 2
+
+    def __init__(self, ignore=None, depth=None, workers=None):
+        self.ignore = tuple(self.ignore if ignore is None else ignore)
+        self.depth = depth or self.depth
+        self.workers = max(1, workers or self.workers)
+
+    def below(self, levels):
+        """A scanner for a subdirectory `levels` below the root we started from."""
+        return Scanner(self.ignore, max(1, self.depth - levels), self.workers)
+
+    def pruned(self, name):
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.ignore)
+
+    @staticmethod
+    def list_dir(path):
+        files, dirs = [], []
+        if not hasattr(os, "scandir"):
+            # ST3's python 3.3 predates scandir; stat each entry instead
+            for name in os.listdir(path):
+                if stat.S_ISDIR(os.lstat(os.path.join(path, name)).st_mode):
+                    dirs.append(name)
+                elif name.endswith(SUFFIXES):
+                    files.append(name)
+            return files, dirs
+
+        # close by hand; scandir only became a context manager in 3.6
+        entries = os.scandir(path)
+        try:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.name.endswith(SUFFIXES):
+                    files.append(entry.name)
+        finally:
+            getattr(entries, "close", lambda: None)()
+        return files, dirs
+
+    def visit(self, path, known):
+        """Stat path; only re-list it if its mtime moved since `known`."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if known and known["mtime"] == mtime:
+                return known, False
+            files, dirs = self.list_dir(path)
+        except OSError:
+            return None, False
+        return {"mtime": mtime, "files": files, "dirs": dirs}, True
+
+    def subtree(self, path, level, known):
+        """Walk path serially; hand back its entries and any subdirs to fan out."""
+        results, handoff = [], []
+        stack = [(path, level)]
+        while stack:
+            path, level = stack.pop()
+            entry, changed = self.visit(path, known.get(path))
+            if entry is None:
+                continue
+            results.append((path, entry, changed))
+
+            # like find -maxdepth: files may sit `depth` levels below root
+            if level + 1 >= self.depth:
+                continue
+            for name in entry["dirs"]:
+                if self.pruned(name):
+                    continue
+                child = (os.path.join(path, name), level + 1)
+                # near the top the subtrees are big enough to be worth a thread
+                (handoff if level < self.fan_out else stack).append(child)
+        return results, handoff
+
+    def walk(self, root, known=None):
+        """
+        Yield (path, entry, changed) for each directory under root.
+
+        `known` maps paths to entries from a previous walk, letting unchanged
+        directories skip the listing.
+        """
+        known = known or {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.subtree, root, 0, known)}
+            while futures:
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results, handoff = future.result()
+                    yield from results
+                    futures.update(
+                        pool.submit(self.subtree, path, level, known)
+                        for path, level in handoff
+                    )
+
+
+class ProjectIndex:
+    _instances = {}
+    # seconds to hold a save, so a burst of watcher relists writes once
+    save_delay = 2.0
+
+    def __init__(self, path):
+        self.path = path
+        self.dirs = {}  # dir -> {"mtime": ns, "files": [...], "dirs": [...]}
+        self.roots = set()
+        self.refreshing = set()
+        self.listeners = []  # fn(added, removed), called with sets of paths
+        self.lock = threading.Lock()
+        self.save_timer = None
+        self.load()
+
+    @classmethod
+    def at(cls, path):
+        if path not in cls._instances:
+            cls._instances[path] = cls(path)
+        return cls._instances[path]
+
+    def load(self):
+        try:
+            with open(self.path) as infile:
+                data = json.load(infile)
+        except (FileNotFoundError, ValueError):
+            return
+        self.dirs = data.get("dirs", {})
+        self.roots = set(data.get("roots", []))
+
+    def save(self):
+        with self.lock:
+            data = {"roots": sorted(self.roots), "dirs": self.dirs}
+            with open(self.path + ".tmp", "w") as outfile:
+                json.dump(data, outfile)
+            os.replace(self.path + ".tmp", self.path)
+
+    def schedule_save(self):
+        """Save in save_delay seconds, taking in whatever changes by then."""
+        with self.lock:
+            if self.save_timer is not None:
+                return
+            self.save_timer = threading.Timer(self.save_delay, self.flush)
+            self.save_timer.daemon = True
+            self.save_timer.start()
+
+    def flush(self):
+        """Save now if a save is pending."""
+        with self.lock:
+            timer, self.save_timer = self.save_timer, None
+        if timer is not None:
+            timer.cancel()
+            self.save()
+
+    @classmethod
+    def flush_all(cls):
+        for index in list(cls._instances.values()):
+            index.flush()
+
+    def scanned(self, root):
+        return root in self.roots
+
+    def refresh(self, root, scanner=None, track=True):
+        """
+        Bring the index up to date for root, re-listing only changed dirs.
+
+        Pass track=False to refresh a directory inside an existing root
+        without recording it as a root of its own.
+        """
+        scanner = scanner or Scanner()
+        seen = {}
+        changed = first = track and root not in self.roots
+        with self.lock:
+            if track:
+                self.refreshing.add(root)
+            known = dict(self.dirs)
+            before = set(self._files(root))
+
+        try:
+            for path, entry, relisted in scanner.walk(root, known):
+                seen[path] = entry
+                if relisted:
+                    changed = True
+                    # publish as we go, so a first scan can be read mid-walk
+                    with self.lock:
+                        self.dirs[path] = entry
+        finally:
+            if track:
+                with self.lock:
+                    self.refreshing.discard(root)
+
+        with self.lock:
+            stale = [
+                path
+                for path in self.dirs
+                if path not in seen and self.under(path, root)
+            ]
+            for path in stale:
+                del self.dirs[path]
+            self.dirs.update(seen)
+            if track:
+                self.roots.add(root)
+            after = set(self._files(root)) if changed or stale else before
+
+        if first:
+            # a first scan is the expensive one; don't risk losing it
+            self.save()
+        elif changed or stale:
+            self.schedule_save()
+
+        added, removed = after - before, before - after
+        if added or removed:
+            for listener in list(self.listeners):
+                listener(added, removed)
+
+    def refresh_in_background(self, root, scanner=None):
+        with self.lock:
+            if root in self.refreshing:
+                return
+            self.refreshing.add(root)
+
+        threading.Thread(
+            target=self.refresh_logged, args=(root, scanner), daemon=True
+        ).start()
+
+    def refresh_logged(self, root, scanner=None):
+        try:
+            self.refresh(root, scanner)
+        except Exception as e:
+            # a dead background thread would otherwise leave root "still searching"
+            print(c.LOG_TEMPLATE, "Failed to index {}: {!r}".format(root, e))
+
+    def wait(self, root, timeout):
+        """Give root's first scan up to timeout seconds; True if it finished."""
+        deadline = time.monotonic() + timeout
+        while not self.scanned(root) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.scanned(root)
+
+    @staticmethod
+    def under(path, root):
+        return path == root or path.startswith(os.path.join(root, ""))
+
+    def _files(self, root, suffix=SUFFIXES):
+        return [
+            os.path.join(path, name)
+            for path, entry in self.dirs.items()
+            if self.under(path, root)
+            for name in entry["files"]
+            if name.endswith(suffix)
+        ]
+
+    def files(self, root, suffix):
+        with self.lock:
+            return self._files(root, suffix)
+
+    def dirs_under(self, root):
+        with self.lock:
+            return [path for path in self.dirs if self.under(path, root)]
@@ -1,9 +1,11 @@
 import sublime
 import sublime_plugin
-import subprocess
-import os
+import html
+from collections.abc import Set
 
 from .api import API
+from .catalog import Catalog
+from . import constants as c
 
 
 class InputConstellationName(sublime_plugin.TextInputHandler):
@@ -23,7 +25,7 @@ class InputConstellationName(sublime_plugin.TextInputHandler):
 
 
 class SelectConstellationList(sublime_plugin.ListInputHandler, API):
-    _generator = lambda self: self.constellations
+    _generator = lambda self: self.snapshot()
 
     def placeholder(self):
         return "Select a Constellation"
@@ -47,6 +49,32 @@ class SelectActiveConstellationList(SelectConstellationList):
     _generator = lambda self: self.active_constellations()
 
 
+class SelectLazyConstellationList(SelectConstellationList):
+    _generator = lambda self: sorted(self._lazy)
+
+
+class InputPriority(sublime_plugin.TextInputHandler):
+    def __init__(self, initial=0):
+        self.initial = str(initial)
+        super().__init__()
+
+    def name(self):
+        return "priority"
+
+    def placeholder(self):
+        return "Priority (higher opens first; 0 is the default)"
+
+    def initial_text(self):
+        return self.initial
+
+    def validate(self, text):
+        try:
+            int(text)
+        except ValueError:
+            return False
+        return True
+
+
 class BaseProjectList(sublime_plugin.ListInputHandler, API):
     def placeholder(self):
         return "Select a .sublime-project"
@@ -56,25 +84,15 @@ class BaseProjectList(sublime_plugin.ListInputHandler, API):
 
 
 class OpenProjectList(BaseProjectList):
-    exclude = []
+    exclude = frozenset()
 
     def __init__(self, exclude=None):
-        self.exclude = exclude or []
+        # keep set-like views (e.g. API.projects_in_constellations) as they are
+        self.exclude = exclude if isinstance(exclude, Set) else set(exclude or [])
         super().__init__()
 
     def list_items(self):
-        projects = [
-            x.extract_variables() for x in sublime.windows() if x.project_file_name()
-        ]
-        return list(
-            set(
-                [
-                    (x["project_name"], x["project"])
-                    for x in projects
-                    if x["project"] not in self.exclude
-                ]
-            )
-        )
+        return Catalog.items(self.open_projects, self.exclude)
 
 
 class ExplicitProjectList(BaseProjectList):
@@ -85,27 +103,90 @@ class ExplicitProjectList(BaseProjectList):
         super().__init__()
 
     def list_items(self):
-        return list(set([(x.split("/")[-1], x) for x in self.projects]))
+        return Catalog.items(self.projects)
 
 
-# TODO: for now, we're assuming the user is smart enough to figure out if there's a workspace/project pair here, but ideally we should check.
+class RankedProjectList(ExplicitProjectList):
+    """Projects in the order given (best match first), not by label"""
+
+    def list_items(self):
+        return [Catalog.info(project).item() for project in self.projects]
 
 
-class UpgradeWorkspaceList(sublime_plugin.ListInputHandler, API):
-    def list_items(self, *args):
-        cmd = "find {:} -maxdepth 5 -name '*.sublime-workspace'".format(
-            self.search_path
+class ProjectQuery(sublime_plugin.TextInputHandler, API):
+    """Type to rank every known project; the preview shows the best few."""
+
+    previewed = 5
+
+    def __init__(self, exclude=None):
+        self.exclude = exclude if isinstance(exclude, Set) else set(exclude or [])
+        self.search = self.project_search()
+        # constellations may have picked up projects since the index was built
+        self.search.add(self.projects_in_constellations())
+        super().__init__()
+
+    def name(self):
+        return "query"
+
+    def placeholder(self):
+        return "Search projects by name or path"
+
+    def preview(self, text):
+        ranked = self.search.search(text, self.previewed, self.exclude)
+        if not ranked:
+            return "No matching projects" if text else "Type to search"
+        return sublime.Html(
+            "<br>".join(
+                "<b>{}</b> <i>{}</i>".format(
+                    html.escape(Catalog.info(project).label),
+                    html.escape(Catalog.info(project).annotation),
+                )
+                for project in ranked
+            )
         )
-        workspaces = set()
-        for path in subprocess.check_output(
-            cmd, shell=True, universal_newlines=True
-        ).splitlines():
-            if not os.path.exists(
-                path.replace(".sublime-workspace", ".sublime-project")
-            ):
-                workspaces.add((path.replace(self.search_path, ".."), path))
 
-        return sorted(list(workspaces))
+    def next_input(self, args):
+        return RankedProjectList(
+            self.search.search(args["query"], exclude=self.exclude)
+        )
+
+
+class StreamingList:
+    """
+    Lists fed by discovery, which may still be scanning a new search path.
+
+    ListInputHandlers can't grow once shown, so we show what we have and add
+    an item that re-opens the list with whatever has turned up since.
+    """
+
+    def streamed(self, items, pending):
+        items = [Catalog.info(path).item(label) for label, path in sorted(items)]
+        if pending:
+            items.append(
+                (
+                    "⋯ still searching ({} so far); select to refresh".format(
+                        len(items)
+                    ),
+                    c.STILL_SEARCHING,
+                )
+            )
+        return items
+
+    def again(self):
+        return type(self)()
+
+    def next_input(self, args):
+        if args.get(self.name()) == c.STILL_SEARCHING:
+            return self.again()
+
+
+# TODO: for now, we're assuming the user is smart enough to figure out if there's a workspace/project pair here, but ideally we should check.
+
+
+class UpgradeWorkspaceList(StreamingList, sublime_plugin.ListInputHandler, API):
+    def list_items(self, *args):
+        workspaces, pending = self.upgradable_workspaces()
+        return self.streamed(set(workspaces), pending)
 
     def placeholder(self):
         return "Select a .sublime-workspace"
@@ -114,18 +195,19 @@ class UpgradeWorkspaceList(sublime_plugin.ListInputHandler, API):
         return "workspace_path"
 
 
-class SearchProjectList(OpenProjectList):
+class SearchProjectList(StreamingList, OpenProjectList):
     def list_items(self, *args):
-        cmd = "find {:} -maxdepth 5 -name '*.sublime-project'".format(self.search_path)
         projects = set()
 
-        for path in subprocess.check_output(
-            cmd, shell=True, universal_newlines=True
-        ).splitlines():
+        found, pending = self.discover(c.PROJECT_SUFFIX)
+        for label, path in found:
             if path not in self.exclude:
-                projects.add((path.replace(self.search_path, ".."), path))
+                projects.add((label, path))
+
+        return self.streamed(projects, pending)
 
-        return sorted(list(projects))
+    def again(self):
+        return type(self)(self.exclude)
 
     def placeholder(self):
         return "Select a .sublime-project"
@@ -141,14 +223,28 @@ class RenameList(SelectActiveConstellationList):
 
 class ProjectList(SelectActiveConstellationList):
     def next_input(self, args):
-        return OpenProjectList(self.constellations[args["constellation"]]["projects"])
+        return OpenProjectList(self.projects_for(args["constellation"]))
 
 
 class ConstellationProjectList(SelectActiveConstellationList):
     def next_input(self, args):
-        return ExplicitProjectList(
-            self.constellations[args["constellation"]]["projects"]
-        )
+        return ExplicitProjectList(self.projects_for(args["constellation"]))
+
+
+class PrioritizedProjectList(ExplicitProjectList):
+    def __init__(self, constellation, projects):
+        self.constellation = constellation
+        super().__init__(projects)
+
+    def next_input(self, args):
+        priority = self.snapshot()[self.constellation].get("priority", {})
+        return InputPriority(priority.get(args["project"], 0))
+
+
+class PriorityProjectList(SelectActiveConstellationList):
+    def next_input(self, args):
+        name = args["constellation"]
+        return PrioritizedProjectList(name, self.projects_for(name))
 
 
 class FoundWorkspaceList(SelectConstellationList):
@@ -156,6 +252,11 @@ class FoundWorkspaceList(SelectConstellationList):
         return UpgradeWorkspaceList()
 
 
+class QueryProjectList(SelectConstellationList):
+    def next_input(self, args):
+        return ProjectQuery(self.projects_for(args["constellation"]))
+
+
 class FoundProjectList(SelectConstellationList):
     def next_input(self, args):
-        return SearchProjectList(self.constellations[args["constellation"]]["projects"])
+        return SearchProjectList(self.projects_for(args["constellation"]))
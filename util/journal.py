@@ -0,0 +1,95 @@
+"""
+Store constellations as a snapshot plus an append-only journal of changes.
+
+Saving through the settings file rewrites every constellation on every
+change. Here, a change appends one line per constellation it touched, and the
+journal is folded back into the snapshot once it grows past a threshold.
+"""
+
+import json
+import os
+
+
+class Journal:
+    compact_after = 1000
+
+    def __init__(self, directory, compact_after=None):
+        self.snapshot_path = os.path.join(directory, "constellations.json")
+        self.journal_path = os.path.join(directory, "constellations.journal")
+        self.compact_after = compact_after or self.compact_after
+        self.entries = 0
+
+    def exists(self):
+        return os.path.exists(self.snapshot_path)
+
+    def load(self):
+        """Read the snapshot and replay the journal over it."""
+        try:
+            with open(self.snapshot_path) as infile:
+                constellations = json.load(infile)
+        except (FileNotFoundError, ValueError):
+            constellations = {}
+
+        self.entries = 0
+        good = 0  # bytes up to the end of the last whole entry
+        torn = False
+        try:
+            with open(self.journal_path, "rb") as infile:
+                for line in infile:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no newline")
+                        entry = json.loads(line.decode("utf-8"))
+                    except ValueError:
+                        # a torn final write; everything before it stands
+                        torn = True
+                        break
+                    if "del" in entry:
+                        constellations.pop(entry["del"], None)
+                    else:
+                        constellations[entry["set"]] = entry["value"]
+                    self.entries += 1
+                    good += len(line)
+        except FileNotFoundError:
+            pass
+
+        if torn:
+            # cut the fragment off, or the next append would run into it
+            with open(self.journal_path, "r+b") as outfile:
+                outfile.truncate(good)
+
+        return constellations
+
+    @staticmethod
+    def diff(before, after):
+        for name in before.keys() - after.keys():
+            yield {"del": name}
+        for name, value in after.items():
+            if before.get(name) != value:
+                yield {"set": name, "value": value}
+
+    def record(self, before, after):
+        """Append whatever changed between before and after."""
+        lines = [json.dumps(entry) + "\n" for entry in self.diff(before, after)]
+        if not lines:
+            return
+
+        if self.entries + len(lines) >= self.compact_after:
+            return self.compact(after)
+
+        with open(self.journal_path, "a") as outfile:
+            outfile.writelines(lines)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        self.entries += len(lines)
+
+    def compact(self, constellations):
+        """Fold everything into a fresh snapshot and start an empty journal."""
+        with open(self.snapshot_path + ".tmp", "w") as outfile:
+            json.dump(constellations, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+        # the snapshot covers the old journal now
+        open(self.journal_path, "w").close()
+        self.entries = 0
@@ -0,0 +1,231 @@
+"""
+Open projects off the main thread.
+
+Rather than sleeping a fixed amount between launches, the opener waits for each
+project's window to actually show up in sublime.windows() (or for a timeout to
+pass) and keeps a bounded number of launches in flight at once.
+
+Projects can be launched through the subl executable, or from inside the
+running editor. The opener times how long each takes to produce a window and,
+when left on "auto", picks whichever has been faster.
+"""
+
+import sublime
+
+import threading
+import time
+
+from . import constants as c
+from .subl import subl, subl_batch
+from .timings import Timings
+
+
+def project_windows():
+    return {win.project_file_name(): win for win in sublime.windows()}
+
+
+def launch_subl(projects):
+    for project in projects:
+        subl("-n", project)
+
+
+def launch_command(projects):
+    def open_all():
+        window = sublime.active_window()
+        for project in projects:
+            window.run_command(
+                "open_project_or_workspace", {"file": project, "new_window": True}
+            )
+
+    # window commands belong on the main thread
+    sublime.set_timeout(open_all, 0)
+
+
+BACKENDS = {"subl": launch_subl, "command": launch_command}
+
+
+def close_stray_views(projects):
+    """Close project files that were opened as plain files in some window"""
+    projects = set(projects)
+
+    def close():
+        for window in sublime.windows():
+            for view in window.views():
+                if view.file_name() in projects:
+                    window.focus_view(view)
+                    window.run_command("close_file")
+
+    sublime.set_timeout(close, 0)
+
+
+class Backends:
+    # name -> [average seconds from launch to window, samples]
+    timings = {}
+
+    @staticmethod
+    def available():
+        # open_project_or_workspace grew new_window in ST4
+        if int(sublime.version()) >= 4050:
+            return ["command", "subl"]
+        return ["subl"]
+
+    @classmethod
+    def choose(cls, preferred="auto"):
+        available = cls.available()
+        if preferred in available:
+            return preferred
+
+        for name in available:
+            if name not in cls.timings:
+                # measure each backend at least once
+                return name
+
+        return min(available, key=lambda name: cls.timings[name][0])
+
+    @classmethod
+    def record(cls, name, seconds):
+        average, samples = cls.timings.get(name, (0.0, 0))
+        samples += 1
+        cls.timings[name] = [average + (seconds - average) / samples, samples]
+
+
+class ProjectOpener(threading.Thread):
+    in_flight = 4
+    timeout = 10.0
+    poll = 0.05
+
+    def __init__(
+        self, projects, in_flight=None, timeout=None, backend="auto", on_done=None
+    ):
+        super().__init__(daemon=True)
+        self.projects = list(projects)
+        self.in_flight = max(1, in_flight or self.in_flight)
+        self.timeout = timeout or self.timeout
+        self.backend = Backends.choose(backend)
+        self.on_done = on_done
+        self.opened = []
+        self.timed_out = []
+        self.windows = {}  # project -> the window it turned up in
+        self.first_window = None  # when the first launched window turned up
+
+    def launch(self, projects):
+        BACKENDS[self.backend](projects)
+
+    def expired(self, launched, now):
+        """Whether to give up on a project launched at launched"""
+        return now - launched >= self.timeout
+
+    def run(self):
+        started = time.monotonic()
+        self.open(self.projects)
+        if self.timed_out and self.backend == "command":
+            # the in-process command may not be opening anything at all; give
+            # whatever it missed a go through subl
+            retry, self.timed_out = self.timed_out, []
+            print(c.LOG_TEMPLATE, "Relaunching through subl:", len(retry))
+            self.backend = "subl"
+            self.open(retry)
+        if self.projects:
+            Timings.record("open_projects", time.monotonic() - started)
+        if self.on_done:
+            sublime.set_timeout(lambda: self.on_done(self), 0)
+
+    def open(self, projects):
+        """Launch projects, waiting on each one's window (or timeout)"""
+        pending = {}  # project -> launch time
+        # reuse windows that are already showing a project
+        already_open = project_windows()
+        queue = []
+        for project in projects:
+            if project in already_open:
+                self.opened.append(project)
+                self.windows[project] = already_open[project]
+            else:
+                queue.append(project)
+
+        while queue or pending:
+            if queue and len(pending) < self.in_flight:
+                take = self.in_flight - len(pending)
+                batch, queue = queue[:take], queue[take:]
+                self.launch(batch)
+                launched = time.monotonic()
+                pending.update((project, launched) for project in batch)
+
+            time.sleep(self.poll)
+
+            ready = project_windows()
+            now = time.monotonic()
+            for project, launched in list(pending.items()):
+                if project in ready:
+                    if self.first_window is None:
+                        self.first_window = now
+                    del pending[project]
+                    self.opened.append(project)
+                    self.windows[project] = ready[project]
+                    Backends.record(self.backend, now - launched)
+                    Timings.record("open_project", now - launched, project)
+                elif self.expired(launched, now):
+                    del pending[project]
+                    self.timed_out.append(project)
+                    if now - launched < self.timeout:
+                        # given up on early (see BatchProjectOpener)
+                        continue
+                    # count it against the backend, or "auto" never moves off
+                    # one that has stopped working
+                    Backends.record(self.backend, self.timeout * 2)
+                    Timings.record("open_timeout", now - launched, project)
+                    print(c.LOG_TEMPLATE, "Timed out waiting for project:", project)
+
+
+class BatchProjectOpener(ProjectOpener):
+    """
+    Launch every project up front in as few subl invocations as possible.
+
+    A single `subl -n` only promises one new window; the rest of its projects
+    may land as plain files in that window instead. So once the first window
+    turns up, the others get `grace` seconds to follow before the stragglers
+    are closed and relaunched one at a time, in_flight at once.
+    """
+
+    grace = 1.0
+
+    def __init__(
+        self, projects, in_flight=None, timeout=None, backend="auto", on_done=None
+    ):
+        super().__init__(
+            projects,
+            in_flight=len(projects),
+            timeout=timeout,
+            backend=backend,
+            on_done=on_done,
+        )
+        # for relaunching one at a time
+        self.retry_in_flight = max(1, in_flight or ProjectOpener.in_flight)
+        # set once the batch has fallen back to launching singly
+        self.one_by_one = False
+
+    @property
+    def batched(self):
+        return self.backend == "subl" and not self.one_by_one
+
+    def launch(self, projects):
+        if self.batched:
+            subl_batch(projects)
+        else:
+            super().launch(projects)
+
+    def expired(self, launched, now):
+        if self.batched and self.first_window is not None:
+            if now - max(launched, self.first_window) >= self.grace:
+                return True
+        return super().expired(launched, now)
+
+    def open(self, projects):
+        super().open(projects)
+        if self.timed_out and self.batched:
+            retry, self.timed_out = self.timed_out, []
+            print(c.LOG_TEMPLATE, "Relaunching one at a time:", len(retry))
+            close_stray_views(retry)
+            self.one_by_one = True
+            self.in_flight = self.retry_in_flight
+            super().open(retry)
@@ -0,0 +1,225 @@
+"""
+Rank projects against a query, fast enough to re-rank on every keystroke.
+
+Each project is indexed by the trigrams of its name and of its path, and by
+the prefixes of the words in its name, so a keystroke only scores projects
+that share something with the query instead of every project we know about.
+Names are matched first; paths only fill in when names turn up too little, and
+trigrams that most paths share (the search root, say) don't count.
+
+Scores blend how well the query matches (trigram overlap and prefix bonuses,
+then subsequence and word-start bonuses for the shortlist) with how recently
+the project was used in a constellation.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from heapq import nlargest
+
+from . import constants as c
+
+WORDS = re.compile(r"[^\W_]+")
+# name prefixes shorter than a trigram are indexed separately
+PREFIX = 2
+
+
+def trigrams(text):
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def fuzzy(query, text):
+    """
+    How well query matches text as a subsequence: 0 if it doesn't, otherwise
+    1-4.5 per character, with extra for consecutive runs and word starts.
+    """
+    score, last = 0.0, -1
+    for char in query:
+        at = text.find(char, last + 1)
+        if at < 0:
+            return 0.0
+        score += 1
+        if at == last + 1:
+            score += 2
+        if at == 0 or not text[at - 1].isalnum():
+            score += 1.5
+        last = at
+    return score / len(query)
+
+
+class RecentProjects:
+    """When each project was last used in a constellation, kept under the cache dir."""
+
+    def __init__(self, path):
+        self.path = path
+        self.used = {}  # project -> time.time() of its last use
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.path) as infile:
+                self.used = json.load(infile)
+        except (FileNotFoundError, ValueError):
+            self.used = {}
+
+    def save(self):
+        with self.lock:
+            used = dict(self.used)
+        with open(self.path + ".tmp", "w") as outfile:
+            json.dump(used, outfile)
+        os.replace(self.path + ".tmp", self.path)
+
+    def touch(self, projects, now=None):
+        now = now or time.time()
+        with self.lock:
+            self.used.update((project, now) for project in projects)
+
+
+class ProjectSearch:
+    limit = 20
+    # how many cheaply-scored candidates get the full fuzzy treatment
+    shortlist = 3
+    # path trigrams in more than this share of projects don't narrow anything
+    common = 0.25
+    # a week-old use counts half as much as one from just now
+    half_life = 7 * 24 * 60 * 60
+
+    def __init__(self, recent=None):
+        self.recent = recent
+        self.names = {}  # project -> lowercase name, without the suffix
+        self.paths = {}  # project -> lowercase path, without the suffix
+        self.name_grams = {}  # trigram -> projects whose name contains it
+        self.path_grams = {}  # trigram -> projects whose path contains it
+        self.prefixes = {}  # short prefix of a name, its words or initials -> projects
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def keys(project):
+        if project.endswith(c.PROJECT_SUFFIX):
+            project = project[: -len(c.PROJECT_SUFFIX)]
+        return os.path.basename(project).lower(), project.lower()
+
+    def prefixes_of(self, name):
+        words = WORDS.findall(name)
+        # initials too, so "bt" finds beta-tools
+        initials = "".join(word[0] for word in words)
+        for word in filter(None, [name, initials] + words):
+            for size in range(1, PREFIX + 1):
+                yield word[:size]
+
+    def add(self, projects):
+        with self.lock:
+            for project in projects:
+                if project in self.names or not project.endswith(c.PROJECT_SUFFIX):
+                    continue
+                name, path = self.keys(project)
+                self.names[project], self.paths[project] = name, path
+                for gram in trigrams(name):
+                    self.name_grams.setdefault(gram, set()).add(project)
+                for gram in trigrams(path):
+                    self.path_grams.setdefault(gram, set()).add(project)
+                for prefix in self.prefixes_of(name):
+                    self.prefixes.setdefault(prefix, set()).add(project)
+
+    def discard(self, projects):
+        with self.lock:
+            for project in projects:
+                name = self.names.pop(project, None)
+                if name is None:
+                    continue
+                for gram in trigrams(name):
+                    self.name_grams[gram].discard(project)
+                for gram in trigrams(self.paths.pop(project)):
+                    self.path_grams[gram].discard(project)
+                for prefix in self.prefixes_of(name):
+                    self.prefixes[prefix].discard(project)
+
+    def update(self, added, removed):
+        """A ProjectIndex listener"""
+        self.discard(removed)
+        self.add(added)
+
+    def __len__(self):
+        return len(self.names)
+
+    def candidates(self, query):
+        """project -> fraction of the query's trigrams it contains"""
+        if len(query) < 3:
+            return dict.fromkeys(self.prefixes.get(query, ()), 1.0)
+
+        wanted = trigrams(query)
+        found = self.overlap(wanted, self.name_grams)
+        if len(found) < self.limit or max(found.values()) < 1:
+            # too few names, or none that match outright; look at the paths too
+            common = self.common * len(self.names)
+            narrowing = {
+                gram for gram in wanted if len(self.path_grams.get(gram, ())) <= common
+            }
+            for project, overlap in self.overlap(narrowing, self.path_grams).items():
+                # a path match counts for less than the same match in the name
+                overlap *= 0.75 * len(narrowing) / len(wanted)
+                found[project] = max(found.get(project, 0.0), overlap)
+        return found
+
+    @staticmethod
+    def overlap(wanted, grams):
+        hits = Counter()
+        for gram in wanted:
+            hits.update(grams.get(gram, ()))
+        # tolerate a typo or two, but not a query that barely overlaps
+        need = max(1, len(wanted) // 2)
+        return {
+            project: count / len(wanted)
+            for project, count in hits.items()
+            if count >= need
+        }
+
+    def recency(self, project, now):
+        used = self.recent.used.get(project) if self.recent else None
+        if used is None:
+            return 0.0
+        return 0.5 ** (max(0.0, now - used) / self.half_life)
+
+    def rough(self, project, query, overlap, now):
+        """A cheap score for every candidate"""
+        score = 4 * overlap + 3 * self.recency(project, now)
+        if self.names[project].startswith(query):
+            score += 3
+        return score
+
+    def score(self, project, query, rough):
+        """The full score, for the shortlist"""
+        name = self.names[project]
+        return rough + 2 * fuzzy(query, name) + (5 if name == query else 0)
+
+    def search(self, query, limit=None, exclude=()):
+        """The best matches for query, best first"""
+        query = query.strip().lower()
+        now = time.time()
+        with self.lock:
+            if not query:
+                # nothing typed yet; offer what was used most recently
+                used = self.recent.used if self.recent else {}
+                ranked = sorted(
+                    (project for project in used if project in self.names),
+                    key=used.get,
+                    reverse=True,
+                )
+            else:
+                rough = [
+                    (self.rough(project, query, overlap, now), project)
+                    for project, overlap in self.candidates(query).items()
+                    if project not in exclude
+                ]
+                keep = (limit or self.limit) * self.shortlist
+                scored = [
+                    (self.score(project, query, score), project)
+                    for score, project in nlargest(keep, rough)
+                ]
+                scored.sort(key=lambda pair: (-pair[0], self.names[pair[1]]))
+                ranked = [project for score, project in scored]
+        ranked = [project for project in ranked if project not in exclude]
+        return ranked[: limit or self.limit]
@@ -25,25 +25,58 @@ import subprocess
 import sublime
 import sublime_plugin
 
+from .timings import Timings
 
-def subl(*args):
+
+# keep well under the shortest platform argv limit (~32k on Windows)
+MAX_BATCH_CHARS = 8000
+
+
+def executable():
     executable_path = sublime.executable_path()
     if sublime.platform() == "osx":
         app_path = executable_path[: executable_path.rfind(".app/") + 5]
         executable_path = app_path + "Contents/SharedSupport/bin/subl"
+    return executable_path
+
+
+def on_activated():
+    window = sublime.active_window()
+    view = window.active_view()
+
+    if sublime.platform() == "windows":
+        # fix focus on windows
+        window.run_command("focus_neighboring_group")
+        window.focus_view(view)
+
+    sublime_plugin.on_activated(view.id())
+    sublime_plugin.on_activated_async(view.id())
+
+
+def subl(*args, activate=True):
+    with Timings.timed("subl_spawn"):
+        subprocess.Popen([executable()] + list(args))
+
+    if activate:
+        sublime.set_timeout(on_activated, 300)
 
-    subprocess.Popen([executable_path] + list(args))
 
-    def on_activated():
-        window = sublime.active_window()
-        view = window.active_view()
+def batches(projects, max_chars=MAX_BATCH_CHARS):
+    batch, size = [], 0
+    for project in projects:
+        if batch and size + len(project) + 1 > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(project)
+        size += len(project) + 1
+    if batch:
+        yield batch
 
-        if sublime.platform() == "windows":
-            # fix focus on windows
-            window.run_command("focus_neighboring_group")
-            window.focus_view(view)
 
-        sublime_plugin.on_activated(view.id())
-        sublime_plugin.on_activated_async(view.id())
+def subl_batch(projects):
+    """Open many project files with as few subl invocations as possible."""
+    for batch in batches(projects):
+        subl("-n", *batch, activate=False)
 
+    # one focus fix for the lot
     sublime.set_timeout(on_activated, 300)
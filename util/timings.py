@@ -0,0 +1,140 @@
+"""
+Record how long opening, closing, saving and searching take.
+
+Samples go into a fixed-size ring buffer that's written to timings.json under
+the cache dir along with our other write-behind state. Each one notes a phase
+(e.g. "open_project", "subl_spawn"), how long it took and, where it applies,
+the project involved; "Constellation: Show timings" summarizes them.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already-sorted list"""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(fraction * len(ordered)) - 1
+    return ordered[max(0, min(len(ordered) - 1, rank))]
+
+
+class Timings:
+    size = 2000
+    path = None
+    samples = deque(maxlen=size)
+    lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, size=None):
+        cls.path = path
+        cls.size = size or cls.size
+        try:
+            with open(path) as infile:
+                samples = json.load(infile)
+        except (FileNotFoundError, ValueError):
+            samples = []
+        with cls.lock:
+            cls.samples = deque(samples, maxlen=cls.size)
+
+    @classmethod
+    def save(cls):
+        if not cls.path:
+            return
+        with cls.lock:
+            samples = list(cls.samples)
+        with open(cls.path + ".tmp", "w") as outfile:
+            json.dump(samples, outfile)
+        os.replace(cls.path + ".tmp", cls.path)
+
+    @classmethod
+    def record(cls, phase, seconds, project=None):
+        sample = {"phase": phase, "seconds": seconds, "at": time.time()}
+        if project:
+            sample["project"] = project
+        with cls.lock:
+            cls.samples.append(sample)
+
+    @classmethod
+    @contextmanager
+    def timed(cls, phase, project=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            cls.record(phase, time.perf_counter() - started, project)
+
+    @classmethod
+    def summary(cls, slowest=10):
+        """
+        {"phases": {phase: {count, p50, p95, max}}, "slowest": [(project,
+        phase, p95, count)]}, with times in seconds.
+        """
+        with cls.lock:
+            samples = list(cls.samples)
+
+        by_phase, by_project = {}, {}
+        for sample in samples:
+            by_phase.setdefault(sample["phase"], []).append(sample["seconds"])
+            if "project" in sample:
+                key = (sample["project"], sample["phase"])
+                by_project.setdefault(key, []).append(sample["seconds"])
+
+        phases = {}
+        for phase, seconds in by_phase.items():
+            seconds.sort()
+            phases[phase] = {
+                "count": len(seconds),
+                "p50": percentile(seconds, 0.5),
+                "p95": percentile(seconds, 0.95),
+                "max": seconds[-1],
+            }
+
+        ranked = []
+        for (project, phase), seconds in by_project.items():
+            seconds.sort()
+            ranked.append((project, phase, percentile(seconds, 0.95), len(seconds)))
+        ranked.sort(key=lambda row: -row[2])
+        return {"phases": phases, "slowest": ranked[:slowest]}
+
+    @classmethod
+    def report(cls, slowest=10):
+        """The summary, as text"""
+        summary = cls.summary(slowest)
+        lines = [
+            "Constellation timings ({} samples; keeping the last {})".format(
+                len(cls.samples), cls.size
+            ),
+            "",
+        ]
+        lines.append(
+            "{:<22} {:>6} {:>10} {:>10} {:>10}".format(
+                "phase", "count", "p50 ms", "p95 ms", "max ms"
+            )
+        )
+        for phase, stats in sorted(summary["phases"].items()):
+            lines.append(
+                "{:<22} {:>6} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                    phase,
+                    stats["count"],
+                    stats["p50"] * 1000,
+                    stats["p95"] * 1000,
+                    stats["max"] * 1000,
+                )
+            )
+
+        lines += ["", "Slowest projects (by p95)", ""]
+        for project, phase, p95, count in summary["slowest"]:
+            lines.append(
+                "{:>10.1f} ms  {:<14} x{:<4} {}".format(
+                    p95 * 1000, phase, count, project
+                )
+            )
+        if not summary["slowest"]:
+            lines.append("(nothing recorded yet)")
+        return "\n".join(lines) + "\n"
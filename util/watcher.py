@@ -0,0 +1,182 @@
+"""
+Keep the project index warm while Sublime is running.
+
+Where inotify is available (Linux) we watch each indexed directory and only
+re-list the ones the kernel tells us about. Everywhere else we fall back to
+periodically refreshing the index, which just stats known directories and
+re-lists the ones whose mtime moved.
+
+Either way, adds and removes reach ProjectIndex listeners as they happen.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+from . import constants as c
+from .discovery import SUFFIXES
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (
+    IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+    | IN_ONLYDIR
+)
+EVENT = struct.Struct("iIII")
+
+
+class Watcher(threading.Thread):
+    interval = 30.0
+
+    def __init__(self, index, roots, scanner, interval=None):
+        super().__init__(daemon=True)
+        self.index = index
+        self.roots = list(roots)
+        self.scanner = scanner
+        self.interval = interval or self.interval
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+
+    def refresh(self):
+        for root in self.roots:
+            self.index.refresh(root, self.scanner)
+
+
+class PollingWatcher(Watcher):
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(c.LOG_TEMPLATE, "Watcher failed to refresh:", e)
+            self.stopping.wait(self.interval)
+
+
+class InotifyWatcher(Watcher):
+    libc = None
+
+    @classmethod
+    def available(cls):
+        if not sys.platform.startswith("linux"):
+            return False
+        if cls.libc is None:
+            try:
+                cls.libc = ctypes.CDLL(
+                    ctypes.util.find_library("c") or "libc.so.6", use_errno=True
+                )
+                cls.libc.inotify_init1
+            except (OSError, AttributeError):
+                cls.libc = False
+        return bool(cls.libc)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fd = None
+        self.watches = {}  # wd -> dir
+        self.watched = {}  # dir -> wd
+
+    def level(self, path):
+        for root in self.roots:
+            if self.index.under(path, root):
+                rel = os.path.relpath(path, root)
+                return 0 if rel == "." else rel.count(os.sep) + 1
+        return None
+
+    def watch(self, path):
+        if path in self.watched:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed", path)
+        self.watches[wd] = path
+        self.watched[path] = wd
+
+    def watch_index(self):
+        for root in self.roots:
+            for path in self.index.dirs_under(root):
+                self.watch(path)
+
+    def relist(self, path):
+        level = self.level(path)
+        if level is None:
+            return
+        # re-walk just this directory, to whatever depth remains below it
+        self.index.refresh(path, self.scanner.below(level), track=False)
+
+    def events(self, data):
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = EVENT.unpack_from(data, offset)
+            name = data[offset + EVENT.size : offset + EVENT.size + length]
+            offset += EVENT.size + length
+            yield wd, mask, os.fsdecode(name.rstrip(b"\0"))
+
+    def handle(self, data):
+        dirty = set()
+        for wd, mask, name in self.events(data):
+            if mask & IN_Q_OVERFLOW:
+                # we've lost track; fall back on mtimes
+                self.refresh()
+                return
+            path = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watched.pop(self.watches.pop(wd, None), None)
+            elif path and (mask & IN_ISDIR or name.endswith(SUFFIXES)):
+                dirty.add(path)
+            elif path and mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                dirty.add(os.path.dirname(path))
+
+        for path in dirty:
+            self.relist(path)
+
+    def run(self):
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            print(c.LOG_TEMPLATE, "inotify unavailable; polling instead")
+            return PollingWatcher.run(self)
+
+        try:
+            self.refresh()
+            self.watch_index()
+            while not self.stopping.is_set():
+                ready, _, _ = select.select([self.fd], [], [], 0.5)
+                if not ready:
+                    continue
+                try:
+                    self.handle(os.read(self.fd, 64 * 1024))
+                except BlockingIOError:
+                    continue
+                self.watch_index()
+        except OSError as e:
+            # most likely out of watches (fs.inotify.max_user_watches)
+            print(c.LOG_TEMPLATE, "inotify failed ({}); polling instead".format(e))
+            os.close(self.fd)
+            self.fd = None
+            return PollingWatcher.run(self)
+
+        os.close(self.fd)
+
+
+def watcher_for(index, roots, scanner, interval=None):
+    cls = InotifyWatcher if InotifyWatcher.available() else PollingWatcher
+    return cls(index, roots, scanner, interval=interval)
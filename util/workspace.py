@@ -0,0 +1,289 @@
+"""
+Patch the "project" field of a .sublime-workspace without loading the file.
+
+Workspaces can carry whole buffers and undo histories, so instead of a
+json.load/json.dump round trip we scan the file in chunks for the top-level
+"project" key, then copy it to a temp file with just that value swapped out
+and move it into place. Memory use stays at a chunk or two however big the
+workspace gets.
+
+Sublime pretty-prints workspaces, and raw newlines can't occur inside JSON
+strings, so a line holding "project": at one level of indentation can only be
+the top-level key; a regex finds it at C speed. Anything else goes through a
+(much slower) byte-level scanner that tracks strings and nesting exactly.
+"""
+
+import json
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import constants as c
+
+CHUNK_SIZE = 1 << 16
+# the first key's indentation tells us what one level looks like
+FIRST_KEY = re.compile(rb'\A\s*\{[ \t]*\r?\n([ \t]+)"')
+STRUCTURE = re.compile(rb'["{}\[\],:]')
+IN_STRING = re.compile(rb'["\\]')
+
+
+class ProjectField:
+    """Where the top-level "project" value sits (or could be inserted)."""
+
+    def __init__(self):
+        self.start = self.end = None  # byte span of the value, after the colon
+        self.raw = bytearray()
+        self.object_start = None  # just inside the top-level {
+        self.has_keys = False
+
+    @property
+    def found(self):
+        return self.end is not None
+
+    @property
+    def value(self):
+        return json.loads(self.raw.decode("utf-8")) if self.found else None
+
+
+def locate_project(path, chunk_size=CHUNK_SIZE):
+    """Find the top-level "project" value in path (or where one could go)."""
+    return locate_indented(path, chunk_size) or locate_exact(path, chunk_size)
+
+
+def locate_indented(path, chunk_size=CHUNK_SIZE):
+    """The fast path for pretty-printed files; None if path isn't one."""
+    with open(path, "rb") as infile:
+        head = infile.read(chunk_size)
+        first = FIRST_KEY.match(head)
+        if not first:
+            return None
+
+        field = ProjectField()
+        field.object_start = head.index(b"{") + 1
+        field.has_keys = True
+        key = re.compile(rb"\n" + re.escape(first.group(1)) + rb'"project"[ \t]*:')
+
+        # carry a little of each chunk over, in case the key straddles two
+        overlap = len(first.group(1)) + 16
+        offset, chunk = 0, head
+        while True:
+            match = key.search(chunk)
+            if match:
+                field.start = offset + match.end()
+                break
+            more = infile.read(chunk_size)
+            if not more:
+                return field
+            keep = chunk[-overlap:]
+            offset += len(chunk) - len(keep)
+            chunk = keep + more
+
+        infile.seek(field.start)
+        window = infile.read(chunk_size)
+        try:
+            text = window.decode("utf-8")
+            stripped = text.lstrip()
+            value, end = json.JSONDecoder().raw_decode(stripped)
+        except ValueError:
+            # value bigger than a chunk (or torn by one); take the slow road
+            return None
+        consumed = len(text[: len(text) - len(stripped) + end].encode("utf-8"))
+        field.end = field.start + consumed
+        field.raw = bytearray(window[:consumed])
+        return field
+
+
+def locate_exact(path, chunk_size=CHUNK_SIZE):
+    """Scan path byte by byte for the top-level "project" value."""
+    field = ProjectField()
+    depth = 0
+    in_string = escape = False
+    key = None  # bytes of the top-level string we're reading, if any
+    last_key = None
+    expect_key = capturing = False
+
+    with open(path, "rb") as infile:
+        offset = 0
+        while not field.found:
+            chunk = infile.read(chunk_size)
+            if not chunk:
+                break
+            i = 0
+            while i < len(chunk) and not field.found:
+                if in_string:
+                    if escape:
+                        escape = False
+                        if capturing:
+                            field.raw += chunk[i : i + 1]
+                        if key is not None:
+                            key += chunk[i : i + 1]
+                        i += 1
+                        continue
+                    match = IN_STRING.search(chunk, i)
+                    j = match.start() if match else len(chunk)
+                    if capturing:
+                        field.raw += chunk[i : j + 1]
+                    if key is not None:
+                        key += chunk[i:j]
+                    if not match:
+                        i = j
+                        continue
+                    i = j + 1
+                    if chunk[j] == ord("\\"):
+                        escape = True
+                        continue
+                    in_string = False
+                    if key is not None:
+                        last_key, key = bytes(key), None
+                    elif capturing and depth == 1:
+                        field.end = offset + i
+                    continue
+
+                match = STRUCTURE.search(chunk, i)
+                j = match.start() if match else len(chunk)
+                if capturing:
+                    field.raw += chunk[i:j]
+                if not match:
+                    i = j
+                    continue
+                char = chunk[j : j + 1]
+                i = j + 1
+
+                if char == b'"':
+                    in_string = True
+                    if depth == 1 and expect_key:
+                        key = bytearray()
+                        expect_key = False
+                        field.has_keys = True
+                    elif capturing:
+                        field.raw += char
+                elif char in b"{[":
+                    depth += 1
+                    if depth == 1 and char == b"{":
+                        field.object_start = offset + i
+                        expect_key = True
+                    elif capturing:
+                        field.raw += char
+                elif char in b"}]":
+                    if capturing and depth == 1:
+                        # a bare literal, ended by the object closing
+                        field.end = offset + j
+                    elif capturing:
+                        field.raw += char
+                        if depth == 2:
+                            field.end = offset + i
+                    depth -= 1
+                elif char == b",":
+                    if capturing and depth == 1:
+                        field.end = offset + j
+                    elif capturing:
+                        field.raw += char
+                    if depth == 1:
+                        expect_key = True
+                elif char == b":":
+                    if capturing:
+                        field.raw += char
+                    elif depth == 1 and last_key == b"project":
+                        capturing = True
+                        field.start = offset + i
+
+            offset += len(chunk)
+
+    return field
+
+
+def copy_range(src, dst, length, chunk_size=CHUNK_SIZE):
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            break
+        dst.write(chunk)
+        length -= len(chunk)
+
+
+def patch_project(path, value, chunk_size=CHUNK_SIZE):
+    """
+    Point the workspace at path's "project" to value, touching nothing else.
+
+    Returns the previous value (None if it was null or missing).
+    """
+    field = locate_project(path, chunk_size)
+    if field.object_start is None:
+        raise ValueError("Not a workspace (no top-level object): " + path)
+
+    encoded = json.dumps(value).encode("utf-8")
+    temp = path + ".constellation-tmp"
+    with open(path, "rb") as src, open(temp, "wb") as dst:
+        if field.found:
+            copy_range(src, dst, field.start, chunk_size)
+            dst.write(b" " + encoded)
+            src.seek(field.end)
+        else:
+            copy_range(src, dst, field.object_start, chunk_size)
+            dst.write(b'\n\t"project": ' + encoded + (b"," if field.has_keys else b""))
+        shutil.copyfileobj(src, dst, chunk_size)
+
+    shutil.copymode(path, temp)
+    os.replace(temp, path)
+    return field.value
+
+
+def hard_link(source, target):
+    """Like ln -f, but without a shell: link to a temp name and move it over."""
+    if os.path.exists(target) and os.path.samefile(source, target):
+        return
+    temp = target + ".constellation-tmp"
+    if os.path.lexists(temp):
+        os.remove(temp)
+    os.link(source, temp)
+    os.replace(temp, target)
+
+
+def upgrade(workspace_path):
+    """
+    Give a workspace an adjacent .sublime-project and point the workspace at it.
+
+    The adjacent project is a hard link to whatever project the workspace was
+    using, or an empty one if that's missing. Returns the adjacent project.
+    """
+    workspace_project = workspace_path.replace(c.WORKSPACE_SUFFIX, c.PROJECT_SUFFIX)
+
+    field = locate_project(workspace_path)
+    if field.object_start is None:
+        raise ValueError("Not a workspace (no top-level object): " + workspace_path)
+    old = field.value or ""
+    project = os.path.join(os.path.dirname(workspace_path), old)
+
+    if len(old) and os.path.exists(project):
+        # this seems to be set to a real value, so we'll make a link to the sublime-project
+        hard_link(project, workspace_project)
+    elif not os.path.exists(workspace_project):
+        # some projects might have a null value, or maybe the file got deleted, so we'll just make an empty project
+        with open(workspace_project, "w") as outfile:
+            json.dump({}, outfile, indent=1)
+
+    # only repoint the workspace once the project it points at exists
+    patch_project(workspace_path, workspace_project)
+    return workspace_project
+
+
+def upgrade_all(workspace_paths, workers=8, progress=None):
+    """
+    Upgrade many workspaces across a thread pool.
+
+    Calls progress(done, total) as each finishes; returns the upgraded
+    projects and (workspace, error) pairs for any that failed.
+    """
+    workspace_paths = list(workspace_paths)
+    upgraded, failed = [], []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(upgrade, path): path for path in workspace_paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            try:
+                upgraded.append(future.result())
+            except (OSError, ValueError) as e:
+                failed.append((futures[future], e))
+            if progress:
+                progress(done, len(workspace_paths))
+    return sorted(upgraded), sorted(failed, key=lambda failure: failure[0])